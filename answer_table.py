@@ -0,0 +1,157 @@
+"""
+Answer Table Module
+===============================
+The functions/classes defined in this class are responsible for materializing
+the answer to every find query ahead of time.
+
+The find query space is finite (every type, every stat and every degree), so
+all answers are computed once and stored in two compact arrays: an array of
+names holding every answer back to back, and an array of offsets where
+answer i is answers[offsets[i]:offsets[i + 1]]. Every query then becomes
+a dictionary lookup and a slice, which is a view and does not copy any names.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from threading import Event, Thread
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from batch_query import BatchQueryEngine, STATS
+from decision_tree import DecisionTree
+
+
+class AnswerTable:
+    """
+    A class that represents a materialized table of every find query's answer
+
+    Instance Attributes:
+        - version: A fingerprint of the dataset and thresholds the table is built
+        from, None if it is unknown
+        - offsets: The boundaries of every answer in answers
+        - answers: The pokemon names of every answer, stored back to back in slot order
+        - slots: A mapping from a (type, "degree stat") pair to the position
+        of its answer in offsets
+
+    Private Instance Attributes:
+        - _df: The dataset the answers are computed from
+        - _conversion_dictionary: The degree to constraints mapping the answers are computed with
+        - _ready: Set once the table has been built
+
+    Representation Invariants:
+        - len(self.offsets) == len(self.slots) + 1
+        - self.offsets[-1] == len(self.answers)
+    """
+    version: Optional[str]
+    offsets: np.ndarray
+    answers: np.ndarray
+    slots: Dict[Tuple[str, str], int]
+    _df: pd.DataFrame
+    _conversion_dictionary: Dict[str, Tuple[Optional[float], Optional[float]]]
+    _ready: Event
+
+    def __init__(self, df: pd.DataFrame, conversion_dictionary: Dict[str, Tuple[Optional[float], Optional[float]]],
+                 version: Optional[str] = None) -> None:
+        """
+        Initialize an empty answer table, which is filled in by build or
+        build_in_background. Nothing is computed until then.
+
+        :param df:
+            Pandas dataframe
+        :param conversion_dictionary:
+            The degree to constraints mapping to compute the answers with
+        :param version:
+            A fingerprint of the dataset and thresholds
+        """
+        self.version = version
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.answers = np.zeros(0, dtype=object)
+        self.slots = {}
+        self._df = df
+        self._conversion_dictionary = conversion_dictionary
+        self._ready = Event()
+
+    def build(self) -> None:
+        """
+        Compute the answer to every (type, degree, stat) find query, including
+        queries on the "all" type.
+        """
+        engine = BatchQueryEngine.from_dataframe(self._df, self._conversion_dictionary)
+        degrees = sorted({conversion_key.split(" ")[0] for conversion_key in self._conversion_dictionary})
+        queries = [(pokemon_type, degree, stat) for pokemon_type in engine.types
+                   for stat in STATS for degree in degrees]
+
+        # The engine unions the answers of every type for the "all" type in the
+        # same order as the decision tree, so ties are in the same order
+        results = engine.evaluate_batch(queries)
+        lengths = np.array([len(answer) for answer in results], dtype=np.int64)
+
+        offsets = np.zeros(len(results) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        answers = np.concatenate(results) if results else np.zeros(0, dtype=object)
+
+        # Publish the finished arrays before marking the table as ready
+        self.offsets = offsets
+        self.answers = answers
+        self.slots = {(pokemon_type, degree + " " + stat): i for i, (pokemon_type, degree, stat) in enumerate(queries)}
+        self._ready.set()
+
+    def build_in_background(self) -> Thread:
+        """
+        Build the table on a daemon thread. Until it is ready, lookup returns
+        None and callers fall back to evaluating their query another way.
+
+        :return:
+            The thread building the table
+        """
+        thread = Thread(target=self.build, name="answer-table-build", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self) -> bool:
+        """Return whether the table has been built.
+        """
+        return self._ready.is_set()
+
+    def lookup(self, query: List[str]) -> Optional[np.ndarray]:
+        """
+        Look up the answer to a find query.
+
+        :param query:
+            A query in the format DecisionTree.evaluate takes: ["type", "stat", "degree" + " " + "stat"]
+        :return:
+            The pokemon names answering the query, in the same order as
+            DecisionTree.evaluate, or None if the table is not ready or
+            does not contain the query
+        """
+        if not self._ready.is_set() or len(query) != 3:
+            return None
+
+        slot = self.slots.get((query[0], query[2]))
+        if slot is None:
+            return None
+
+        return self.answers[self.offsets[slot]:self.offsets[slot + 1]]
+
+    def cross_check(self, decision_tree: DecisionTree) -> List[Tuple[str, str]]:
+        """
+        Compares every answer in this table with the result of evaluating the
+        same query on a decision tree, and returns every query whose results differ.
+
+        :param decision_tree:
+            A decision tree created by create_decision_tree, with the same thresholds as this table
+        :return:
+            The (type, "degree stat") slots whose answers do not match, empty if the table is not ready
+        """
+        if not self._ready.is_set():
+            return []
+
+        mismatches = []
+        for pokemon_type, conversion_key in self.slots:
+            stat = conversion_key.split(" ")[1]
+            tree_result = decision_tree._evaluate([pokemon_type, stat, conversion_key])
+            answer = self.lookup([pokemon_type, stat, conversion_key])
+            if list(tree_result) != answer.tolist():
+                mismatches.append((pokemon_type, conversion_key))
+        return mismatches
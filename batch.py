@@ -0,0 +1,168 @@
+"""
+Batch Module
+===============================
+The functions defined in this class are responsible for running queries
+without the GUI. Queries are read one per line, and the result of each query
+is written as one line of JSON as soon as it is evaluated, so a batch can be
+used to regression-test the query structures or to score many queries in bulk.
+
+Every query goes through the same parse_query -> query plan -> query
+structure path as the GUI, and the query structures are built once
+and shared by every query in the batch.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+import json
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+import numpy as np
+import pandas as pd
+from bitmap_index import BitmapIndex
+from decision_tree import DecisionTree
+from process import fetch_values, create_tree_bitmap_index
+from query import AGGREGATES, QueryPlan, parse_query
+
+# The latency percentiles reported at the end of a batch
+PERCENTILES = [50, 90, 99]
+
+
+def evaluate_query(query: str, df: pd.DataFrame, decision_tree: DecisionTree,
+                   bitmap_index: Optional[BitmapIndex]) -> Dict[str, Any]:
+    """
+    Evaluates a single query.
+
+    :param query:
+        A query, as it would be typed into the GUI
+    :param df:
+        A pandas dataframe, used by plot queries
+    :param decision_tree:
+        The decision tree used to evaluate find queries
+    :param bitmap_index:
+        The bitmap index used to evaluate find queries with several stat conditions
+    :return:
+        The JSON object written for the query. Find queries have the names of the
+        pokemon they return under "results", plot queries have the values that
+        would be plotted under "values", aggregate queries have the aggregate under
+        "value" and malformed queries have an "error".
+    """
+    plan = parse_query(query, decision_tree.degrees())
+    if plan is None:
+        return {"query": query, "error": "malformed query"}
+    return evaluate_plan(plan, df, decision_tree, bitmap_index)
+
+
+def evaluate_plan(plan: QueryPlan, df: pd.DataFrame, decision_tree: DecisionTree,
+                  bitmap_index: Optional[BitmapIndex]) -> Dict[str, Any]:
+    """
+    Evaluates a parsed query on the path it was planned on.
+
+    :param plan:
+        The plan of a valid query
+    :param df:
+        A pandas dataframe, used by plot queries
+    :param decision_tree:
+        The decision tree used to evaluate find and aggregate queries
+    :param bitmap_index:
+        The bitmap index used to evaluate find queries with several stat conditions
+    :return:
+        The JSON object written for the query, see evaluate_query
+    """
+    if plan.path == "histogram":
+        values = fetch_values(plan.pokemon_type, plan.stat, df)
+        return {"query": plan.text, "values": [int(value) for value in values]}
+
+    if plan.action in AGGREGATES:
+        return {"query": plan.text, "value": decision_tree.aggregate(plan.tree_query(), plan.action, plan.target_stat)}
+
+    if plan.path == "bitmap":
+        results = bitmap_index.evaluate(plan.bitmap_query())
+    else:
+        results = decision_tree.evaluate(plan.tree_query())
+    results = [] if results is None else [str(name) for name in results]
+    return {"query": plan.text, "count": len(results), "results": results}
+
+
+def run_batch(queries: Iterable[str], df: pd.DataFrame, decision_tree: DecisionTree,
+              bitmap_index: Optional[BitmapIndex] = None, out: Optional[TextIO] = None) -> Dict[str, Any]:
+    """
+    Evaluates every query and writes one line of JSON per query to out, in
+    the order the queries were given. A query that fails is reported with
+    an "error" instead of stopping the batch.
+
+    :param queries:
+        The queries, one per element. Blank elements are skipped.
+    :param df:
+        A pandas dataframe
+    :param decision_tree:
+        The decision tree built from df
+    :param bitmap_index:
+        The bitmap index built from df, built on first use (with the thresholds
+        of decision_tree) if it is not given
+    :param out:
+        The file the results are written to, standard output by default
+    :return:
+        A summary of the batch: the number of queries and errors, the
+        throughput and the latency percentiles of the queries
+    """
+    out = sys.stdout if out is None else out
+    degrees = decision_tree.degrees()
+    latencies: List[float] = []
+    errors = 0
+
+    start = time.perf_counter()
+    for line in queries:
+        query = line.strip()
+        if query == "":
+            continue
+
+        query_start = time.perf_counter()
+        try:
+            plan = parse_query(query, degrees)
+            if plan is None:
+                record = {"query": query, "error": "malformed query"}
+            else:
+                if bitmap_index is None and plan.path == "bitmap":
+                    bitmap_index = create_tree_bitmap_index(df, decision_tree)
+                record = evaluate_plan(plan, df, decision_tree, bitmap_index)
+        except Exception as error:  # One bad query should not stop the rest of the batch
+            record = {"query": query, "error": str(error)}
+        latency = time.perf_counter() - query_start
+
+        latencies.append(latency)
+        if "error" in record:
+            errors += 1
+        record["ms"] = round(latency * 1000, 3)
+        out.write(json.dumps(record) + "\n")
+
+    elapsed = time.perf_counter() - start
+    out.flush()
+    return summarize(latencies, errors, elapsed)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """
+    Summarizes the latencies of a batch.
+
+    >>> summarize([0.001, 0.003], 1, 0.5)["queries_per_second"]
+    4.0
+
+    :param latencies:
+        The latency of every query, in seconds
+    :param errors:
+        The number of queries that failed
+    :param elapsed:
+        The wall time of the whole batch, in seconds
+    :return:
+        The number of queries and errors, the throughput and the latency percentiles
+    """
+    summary = {"queries": len(latencies), "errors": errors, "seconds": round(elapsed, 6),
+               "queries_per_second": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0}
+    if len(latencies) > 0:
+        milliseconds = np.array(latencies) * 1000
+        for percentile, value in zip(PERCENTILES, np.percentile(milliseconds, PERCENTILES)):
+            summary["p" + str(percentile) + "_ms"] = round(float(value), 3)
+        summary["max_ms"] = round(float(milliseconds.max()), 3)
+    return summary
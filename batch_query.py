@@ -0,0 +1,248 @@
+"""
+Batch Query Module
+===============================
+The functions/classes defined in this class are responsible for answering
+many find queries at once, instead of walking the decision tree once per query.
+
+The engine answers queries on the sorted-array range index of every (type, stat)
+pair. When it is built from a decision tree with the "sorted_array" backend, it
+uses the tree's own indexes, so no stat column is copied. A batch is grouped by
+(type, stat), and every group is answered with two np.searchsorted calls over
+the lower and upper bounds of all of its queries. Each result is a slice of an
+index's names array, which is a view and does not copy any names.
+
+The results are identical (including their order) to DecisionTree.evaluate,
+so the engine can be used both as a fast path for offline scoring and as a
+cross-check of the tree.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from decision_tree import DecisionTree
+from sorted_index import SortedArrayIndex
+
+STATS = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
+
+# The (stat values, names) answer of a query with no results
+_EMPTY = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=object))
+
+
+class BatchQueryEngine:
+    """
+    A class that answers batches of (type, degree, stat) find queries
+
+    Instance Attributes:
+        - conversion_dictionaries: A mapping from every pokemon type to the
+        degree to constraints mapping its queries use
+        - types: Every pokemon type, followed by "all"
+        - indexes: A mapping from a (type, stat) pair to the sorted-array range
+        index of that stat over every pokemon of that type
+
+    Representation Invariants:
+        - all(stat in STATS for _, stat in self.indexes)
+        - all(pokemon_type in self.conversion_dictionaries for pokemon_type, _ in self.indexes)
+        - self.types[-1] == "all"
+    """
+    conversion_dictionaries: Dict[str, Dict[str, Tuple[Optional[float], Optional[float]]]]
+    types: List[str]
+    indexes: Dict[Tuple[str, str], SortedArrayIndex]
+
+    def __init__(self, indexes: Dict[Tuple[str, str], SortedArrayIndex],
+                 conversion_dictionaries: Dict[str, Dict[str, Tuple[Optional[float], Optional[float]]]]) -> None:
+        """
+        Initialize an engine over existing range indexes. See from_decision_tree
+        and from_dataframe.
+
+        :param indexes:
+            The range index of every (type, stat) pair
+        :param conversion_dictionaries:
+            The degree to constraints mapping of every pokemon type
+        """
+        self.indexes = indexes
+        self.conversion_dictionaries = conversion_dictionaries
+        self.types = list(conversion_dictionaries) + ["all"]
+
+    @classmethod
+    def from_decision_tree(cls, decision_tree: DecisionTree) -> BatchQueryEngine:
+        """
+        Build an engine that shares the range indexes and thresholds of a
+        decision tree, including per-type thresholds.
+
+        Preconditions:
+            - decision_tree.category is None (this is the root of a decision tree)
+
+        :param decision_tree:
+            A decision tree created by create_decision_tree(df, backend="sorted_array")
+        :return:
+            A batch query engine
+        """
+        indexes = {}
+        conversion_dictionaries = {}
+        for type_tree in decision_tree.subtrees:
+            for stat_tree in type_tree.subtrees:
+                if not isinstance(stat_tree.subtrees[0], SortedArrayIndex):
+                    raise ValueError("the batch query engine needs a decision tree with the sorted_array backend")
+                indexes[(type_tree.category, stat_tree.category)] = stat_tree.subtrees[0]
+            conversion_dictionaries[type_tree.category] = type_tree.subtrees[0].conversion_dictionary
+        return cls(indexes, conversion_dictionaries)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame,
+                       conversion_dictionary: Dict[str, Tuple[Optional[float], Optional[float]]]) \
+            -> BatchQueryEngine:
+        """
+        Build an engine with its own range indexes, ordered the same way as
+        the indexes of a decision tree built from the same dataframe.
+
+        :param df:
+            A pandas dataframe
+        :param conversion_dictionary:
+            A degree to constraints mapping, as produced by find_quantiles
+        :return:
+            A batch query engine
+        """
+        names = df.loc[:, "name"].to_numpy()
+        type1 = df.loc[:, "type1"].to_numpy()
+        type2 = df.loc[:, "type2"].to_numpy()
+        unique_types = np.unique(type1).tolist()
+
+        indexes = {}
+        for pokemon_type in unique_types:
+            # Like group_rows_by_type, the rows of a type are kept in dataset order
+            members = np.flatnonzero((type1 == pokemon_type) | (type2 == pokemon_type))
+            for stat in STATS:
+                indexes[(pokemon_type, stat)] = SortedArrayIndex.from_unsorted(
+                    names[members], df.loc[:, stat].to_numpy()[members])
+        return cls(indexes, {pokemon_type: conversion_dictionary for pokemon_type in unique_types})
+
+    def evaluate_batch(self, queries: List[Tuple[str, str, str]]) -> List[np.ndarray]:
+        """
+        Evaluates many find queries at once.
+
+        :param queries:
+            A list of queries in the form (type, degree, stat), ex: ("fire", "high", "attack")
+        :return:
+            A list where element i is an array of the names that answer queries[i],
+            in the same order DecisionTree.evaluate returns them. Unknown types
+            have no results. For a query on a single type, the array is a slice
+            of a range index, so nothing is copied.
+        """
+        results = [_EMPTY[1]] * len(queries)
+        ranges, all_queries = self._position_ranges(queries)
+        for i, index, start, end in ranges:
+            results[i] = index.names[start:end]
+        for i, (_, names) in self._union_items(queries, all_queries):
+            results[i] = names
+        return results
+
+    def evaluate_batch_items(self, queries: List[Tuple[str, str, str]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Evaluates many find queries at once, like evaluate_batch, but also
+        returns the stat values of the pokemon that answer each query.
+
+        :param queries:
+            A list of queries in the form (type, degree, stat)
+        :return:
+            A list where element i is a (stat values, names) pair of parallel
+            arrays answering queries[i]
+        """
+        results = [_EMPTY] * len(queries)
+        ranges, all_queries = self._position_ranges(queries)
+        for i, index, start, end in ranges:
+            results[i] = (index.values[start:end], index.names[start:end])
+        for i, items in self._union_items(queries, all_queries):
+            results[i] = items
+        return results
+
+    def _position_ranges(self, queries: List[Tuple[str, str, str]]) \
+            -> Tuple[List[Tuple[int, SortedArrayIndex, int, int]], List[int]]:
+        """
+        Return an (i, index, start, end) range for every query on a single type,
+        where index.names[start:end] answers queries[i], and the positions of the
+        queries on "all". Queries on the same range index are answered together,
+        with one binary search over all of their lower bounds and one over all
+        of their upper bounds.
+        """
+        ranges = []
+        all_queries = []
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for i, (pokemon_type, _, stat) in enumerate(queries):
+            if pokemon_type == "all":
+                all_queries.append(i)
+            elif (pokemon_type, stat) in self.indexes:
+                groups.setdefault((pokemon_type, stat), []).append(i)
+
+        for (pokemon_type, stat), positions in groups.items():
+            index = self.indexes[(pokemon_type, stat)]
+            conversion_dictionary = self.conversion_dictionaries[pokemon_type]
+            thresholds = [conversion_dictionary[queries[i][1] + " " + stat] for i in positions]
+            lower = np.array([0 if threshold[0] is None else threshold[0] for threshold in thresholds])
+            upper = np.array([500 if threshold[1] is None else threshold[1] for threshold in thresholds])
+            starts = index.values.searchsorted(lower, side="left").tolist()
+            ends = index.values.searchsorted(upper, side="right").tolist()
+            ranges.extend((i, index, start, max(start, end)) for i, start, end in zip(positions, starts, ends))
+        return ranges, all_queries
+
+    def _union_items(self, queries: List[Tuple[str, str, str]], all_queries: List[int]) \
+            -> Iterator[Tuple[int, Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Yield (i, (stat values, names)) for every position i in all_queries, where
+        queries[i] is a query on "all" answered as the union of every type.
+        """
+        if not all_queries:
+            return
+        types = self.types[:-1]
+        type_queries = [(pokemon_type, queries[i][1], queries[i][2]) for i in all_queries for pokemon_type in types]
+        type_items = self.evaluate_batch_items(type_queries)
+        for j, i in enumerate(all_queries):
+            yield i, _union(type_items[j * len(types):(j + 1) * len(types)])
+
+    def cross_check(self, decision_tree: DecisionTree, queries: List[Tuple[str, str, str]]) \
+            -> List[Tuple[str, str, str]]:
+        """
+        Evaluates queries both with this engine and with a decision tree, and
+        returns every query whose results differ.
+
+        :param decision_tree:
+            A decision tree created by create_decision_tree
+        :param queries:
+            A list of queries in the form (type, degree, stat), including queries on "all"
+        :return:
+            The queries whose results do not match
+        """
+        batch_results = self.evaluate_batch(queries)
+
+        mismatches = []
+        for (pokemon_type, degree, stat), batch_result in zip(queries, batch_results):
+            tree_result = decision_tree.evaluate([pokemon_type, stat, degree + " " + stat])
+            if list(tree_result) != batch_result.tolist():
+                mismatches.append((pokemon_type, degree, stat))
+
+        return mismatches
+
+
+def _union(type_items: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge the (stat values, names) answers of every type into the answer of the
+    "all" type, in the order DecisionTree unions them: ascending stat, ties in the
+    order of the types and then of each type's answer, and every pokemon only once.
+
+    >>> first = (np.array([5, 5]), np.array(["b", "a"], dtype=object))
+    >>> second = (np.array([3, 5]), np.array(["c", "a"], dtype=object))
+    >>> _union([first, second])[1].tolist()
+    ['c', 'b', 'a']
+    """
+    if not type_items:
+        return _EMPTY
+    values = np.concatenate([item[0] for item in type_items])
+    names = np.concatenate([item[1] for item in type_items])
+    order = np.argsort(values, kind="stable")
+    values, names = values[order], names[order]
+
+    _, first = np.unique(names, return_index=True)
+    first.sort()
+    return values[first], names[first]
@@ -0,0 +1,231 @@
+"""
+Benchmark Module
+===============================
+The functions defined in this class are responsible for measuring how the
+time of reading the data, building the trees and answering queries grows
+with the size of the dataset.
+
+Every benchmark is run on synthetic datasets (see synthetic_data.py) of the
+requested sizes and orderings, and the results are written as JSON. Passing
+the results of an earlier commit with --compare reports every benchmark that
+became slower, so scaling regressions are caught before they are merged.
+
+Example:
+    python benchmark.py --rows 1000 10000 100000 --output results.json
+    python benchmark.py --rows 1000 10000 100000 --compare results.json
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from process import (read_data, find_quantiles, create_bst, create_decision_tree,
+                     create_batch_query_engine, generate_pokemon_to_stats_mapping)
+from synthetic_data import STATS, write_csv
+
+BENCHMARKS = ["read_data", "find_quantiles", "create_bst", "create_decision_tree",
+              "find_nodes_with_constraints", "evaluate", "evaluate_batch", "generate_pokemon_to_stats_mapping"]
+
+DEGREES = ["low", "medium", "high"]
+
+
+def time_call(function: Callable[[], Any], repeat: int) -> List[float]:
+    """
+    Calls a function repeat times.
+
+    :param function:
+        The function to time
+    :param repeat:
+        The number of calls
+    :return:
+        The wall time of every call, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(path: str, rows: int, order: str, repeat: int, backend: str = "bst",
+                   skip: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Runs every benchmark on one dataset.
+
+    :param path:
+        The path of the CSV file of the dataset
+    :param rows:
+        The number of rows in the dataset
+    :param order:
+        The order the dataset was generated in, only used to label the results
+    :param repeat:
+        The number of times each benchmark is timed
+    :param backend:
+        The backend of the decision tree, see create_decision_tree
+    :param skip:
+        The names of benchmarks that are not run
+    :return:
+        One result per benchmark that was run
+    """
+    skip = [] if skip is None else skip
+    results = []
+
+    def record(benchmark: str, function: Callable[[], Any], operations: int) -> None:
+        if benchmark in skip:
+            return
+        times = time_call(function, repeat)
+        results.append({"benchmark": benchmark, "rows": rows, "order": order, "backend": backend,
+                        "seconds": times, "best": min(times), "median": statistics.median(times),
+                        "ns_per_operation": min(times) / max(1, operations) * 1e9})
+
+    df = read_data(path)
+    conversion_dictionary = find_quantiles(df)
+    names = df.loc[:, "name"].to_numpy()
+    attack = df.loc[:, "attack"].to_numpy()
+    types = np.unique(df.loc[:, "type1"].to_numpy()).tolist()
+    queries = [[pokemon_type, stat, degree + " " + stat] for pokemon_type in types
+               for stat in STATS for degree in DEGREES]
+    thresholds = [conversion_dictionary[degree + " attack"] for degree in DEGREES]
+
+    record("read_data", lambda: read_data(path), rows)
+    record("find_quantiles", lambda: find_quantiles(df), rows)
+    record("create_bst", lambda: create_bst(names, attack), rows)
+    record("create_decision_tree",
+           lambda: create_decision_tree(df, backend=backend, conversion_dictionary=conversion_dictionary), rows)
+
+    if "find_nodes_with_constraints" not in skip:
+        bst = create_bst(names, attack)
+        record("find_nodes_with_constraints",
+               lambda: [bst.find_nodes_with_constraints(threshold) for threshold in thresholds], rows)
+
+    if "evaluate" not in skip:
+        decision_tree = create_decision_tree(df, backend=backend, conversion_dictionary=conversion_dictionary)
+        # Every pokemon is returned by a third of the queries on each of its types
+        record("evaluate", lambda: [decision_tree.evaluate(query) for query in queries], len(queries))
+
+    if "evaluate_batch" not in skip:
+        # The same queries as evaluate, answered in one batch on sorted-array indexes
+        sorted_tree = create_decision_tree(df, backend="sorted_array", conversion_dictionary=conversion_dictionary)
+        engine = create_batch_query_engine(df, decision_tree=sorted_tree)
+        batch = [(pokemon_type, degree.split(" ")[0], stat) for pokemon_type, stat, degree in queries]
+        record("evaluate_batch", lambda: engine.evaluate_batch(batch), len(batch))
+
+    record("generate_pokemon_to_stats_mapping", lambda: generate_pokemon_to_stats_mapping(df), rows)
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) \
+        -> List[Dict[str, Any]]:
+    """
+    Compares results with the results of an earlier run.
+
+    >>> old = [{"benchmark": "evaluate", "rows": 10, "order": "random", "backend": "bst", "median": 1.0}]
+    >>> new = [{"benchmark": "evaluate", "rows": 10, "order": "random", "backend": "bst", "median": 1.5}]
+    >>> compare(new, old, 0.25)[0]["ratio"]
+    1.5
+
+    :param results:
+        The results of this run
+    :param baseline:
+        The results of an earlier run
+    :param tolerance:
+        How much slower (as a fraction of the baseline median) a benchmark can
+        be before it is reported
+    :return:
+        Every benchmark (present in both runs) whose median time grew by more than tolerance
+    """
+    def key(result: Dict[str, Any]) -> tuple:
+        return result["benchmark"], result["rows"], result["order"], result["backend"]
+
+    baseline_medians = {key(result): result["median"] for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline_medians.get(key(result))
+        if old is not None and old > 0 and result["median"] > old * (1 + tolerance):
+            regressions.append({"benchmark": result["benchmark"], "rows": result["rows"],
+                                "order": result["order"], "backend": result["backend"],
+                                "baseline": old, "median": result["median"],
+                                "ratio": round(result["median"] / old, 3)})
+    return regressions
+
+
+def environment() -> Dict[str, Optional[str]]:
+    """
+    Returns the commit and library versions the benchmarks ran with.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "pandas": pd.__version__, "machine": platform.machine()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the pokemon recommender on synthetic data")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="the dataset sizes to benchmark (up to 10000000, but a BST over 10 million "
+                             "rows needs several GB of memory, see --skip and --backend)")
+    parser.add_argument("--order", nargs="+", choices=["random", "sorted"], default=["random", "sorted"],
+                        help="the orders of the synthetic rows")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of times each benchmark is timed")
+    parser.add_argument("--backend", choices=["bst", "sorted_array"], default="bst",
+                        help="the backend of the decision tree")
+    parser.add_argument("--skip", nargs="*", choices=BENCHMARKS, default=[], help="benchmarks not to run")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the synthetic data")
+    parser.add_argument("--data-dir", default=None,
+                        help="where the synthetic CSV files are kept, so later runs can reuse them "
+                             "(a temporary directory by default)")
+    parser.add_argument("--output", default=None, help="the JSON file to write (standard output by default)")
+    parser.add_argument("--compare", metavar="BASELINE", default=None,
+                        help="the JSON results of an earlier run, exits with status 1 if any benchmark "
+                             "is slower than in it by more than --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the fraction a benchmark can slow down by before it is a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = temp_dir if args.data_dir is None else args.data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        source = read_data()
+
+        results = []
+        for rows in args.rows:
+            for order in args.order:
+                path = os.path.join(data_dir, "pokemon_{}_{}_{}.csv".format(rows, order, args.seed))
+                if not os.path.exists(path):
+                    write_csv(path, rows, source, order, args.seed)
+                print("benchmarking {} {} rows".format(rows, order), file=sys.stderr)
+                results.extend(run_benchmarks(path, rows, order, args.repeat, args.backend, args.skip))
+
+    report = {"environment": environment(), "results": results}
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION {benchmark} ({rows} {order} rows, {backend}): {baseline:.4f}s -> "
+                  "{median:.4f}s ({ratio}x)".format(**regression), file=sys.stderr)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
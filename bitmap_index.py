@@ -0,0 +1,152 @@
+"""
+Bitmap Index Module
+===============================
+The functions/classes defined in this class are responsible for representing
+a bitmap index over the pokemon dataset, which is used to answer conjunctive
+queries with several stat conditions (ex: "find fire high attack high speed low hp").
+
+Every pokemon type and every "degree stat" condition is precomputed as a packed
+bitset with one bit per pokemon (row of the dataframe), stored as 64-bit words.
+A conjunctive query is then just a bitwise AND of a handful of word arrays.
+
+When every type has its own thresholds (like a decision tree built with
+per-type thresholds), the condition bitmaps are computed per type, and a
+query on "all" is the OR of the query on every type.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+class BitmapIndex:
+    """
+    A class that represents a bitmap index over the pokemon dataset
+
+    Instance Attributes:
+        - names: The pokemon names in dataset order, bit i of every bitmap
+        refers to names[i]
+        - type_bitmaps: A mapping from a pokemon type (or "all") to the bitmap of
+        all pokemon of that type
+        - condition_bitmaps: A mapping from a conversion key (ex: "high attack")
+        to the bitmap of all pokemon that satisfy that condition
+        - type_condition_bitmaps: A mapping from a pokemon type to its own
+        condition bitmaps, used instead of condition_bitmaps for that type.
+        Empty unless the index was built with per-type thresholds
+
+    Representation Invariants:
+        - all(len(bitmap) == (len(self.names) + 63) // 64 for bitmap in self.type_bitmaps.values())
+        - all(len(bitmap) == (len(self.names) + 63) // 64 for bitmap in self.condition_bitmaps.values())
+    """
+    names: np.ndarray
+    type_bitmaps: Dict[str, np.ndarray]
+    condition_bitmaps: Dict[str, np.ndarray]
+    type_condition_bitmaps: Dict[str, Dict[str, np.ndarray]]
+
+    def __init__(self, df: pd.DataFrame,
+                 conversion_dictionary: Dict[str, Tuple[Optional[float], Optional[float]]],
+                 type_conversion_dictionaries: Optional[Dict[str, Dict[str, Tuple[Optional[float],
+                                                                                  Optional[float]]]]] = None) \
+            -> None:
+        """
+        Precompute the type and condition bitmaps of a dataframe.
+
+        :param df:
+            A pandas dataframe
+        :param conversion_dictionary:
+            A degree to constraints mapping, as produced by find_quantiles
+        :param type_conversion_dictionaries:
+            A degree to constraints mapping for every pokemon type (as produced by
+            find_type_quantiles), if every type has its own thresholds
+        """
+        self.names = df.loc[:, "name"].to_numpy()
+        self.type_bitmaps = {"all": _pack(np.ones(len(df), dtype=bool))}
+
+        type1 = df.loc[:, "type1"].to_numpy()
+        type2 = df.loc[:, "type2"].to_numpy()
+        for pokemon_type in np.unique(type1):
+            self.type_bitmaps[pokemon_type] = _pack((type1 == pokemon_type) | (type2 == pokemon_type))
+
+        self.condition_bitmaps = _condition_bitmaps(df, conversion_dictionary)
+        self.type_condition_bitmaps = {}
+        if type_conversion_dictionaries is not None:
+            for pokemon_type, type_conversion_dictionary in type_conversion_dictionaries.items():
+                self.type_condition_bitmaps[pokemon_type] = _condition_bitmaps(df, type_conversion_dictionary)
+
+    def evaluate(self, query: List[str]) -> List[str]:
+        """
+        Evaluates a conjunctive query on this index.
+
+        Preconditions:
+            - query[0] in self.type_bitmaps
+            - all(key in self.condition_bitmaps for key in query[1:])
+
+        :param query:
+            A list of strings in the form ["type", "degree stat", "degree stat", ...]
+        :return:
+            The names of all pokemon of the given type that satisfy every
+            condition, in dataset order
+        """
+        if query[0] == "all" and len(self.type_condition_bitmaps) > 0:
+            # Like the decision tree, every type is queried with its own thresholds
+            bitmap = np.zeros_like(self.type_bitmaps["all"])
+            for pokemon_type in self.type_condition_bitmaps:
+                bitmap |= self._evaluate_bitmap([pokemon_type] + query[1:])
+        else:
+            bitmap = self._evaluate_bitmap(query)
+
+        return self.names[_unpack(bitmap, len(self.names))].tolist()
+
+    def _evaluate_bitmap(self, query: List[str]) -> np.ndarray:
+        """
+        Return the bitmap of the pokemon of the type query[0] that satisfy every
+        condition in query[1:], using that type's own condition bitmaps if it has any.
+        """
+        condition_bitmaps = self.type_condition_bitmaps.get(query[0], self.condition_bitmaps)
+        bitmap = self.type_bitmaps[query[0]].copy()
+        for conversion_key in query[1:]:
+            bitmap &= condition_bitmaps[conversion_key]
+        return bitmap
+
+
+def _condition_bitmaps(df: pd.DataFrame, conversion_dictionary: Dict[str, Tuple[Optional[float], Optional[float]]]) \
+        -> Dict[str, np.ndarray]:
+    """
+    Return a mapping from every conversion key of conversion_dictionary to the
+    bitmap of the pokemon of df that satisfy that condition.
+    """
+    condition_bitmaps = {}
+    for conversion_key, threshold in conversion_dictionary.items():
+        stat = conversion_key.split(" ")[1]
+        stat_column = df.loc[:, stat].to_numpy()
+
+        # Missing bounds are handled the same way as the BST does
+        left_threshold = 0 if threshold[0] is None else threshold[0]
+        right_threshold = 500 if threshold[1] is None else threshold[1]
+
+        mask = (stat_column >= left_threshold) & (stat_column <= right_threshold)
+        condition_bitmaps[conversion_key] = _pack(mask)
+    return condition_bitmaps
+
+
+def _pack(mask: np.ndarray) -> np.ndarray:
+    """
+    Pack a boolean mask into an array of 64-bit words, where bit i of the
+    bitmap (counting from the least significant bit of word 0) is mask[i].
+    """
+    n_words = (len(mask) + 63) // 64
+    padded = np.zeros(n_words * 64, dtype=bool)
+    padded[:len(mask)] = mask
+    return np.packbits(padded, bitorder="little").view(np.uint64)
+
+
+def _unpack(bitmap: np.ndarray, length: int) -> np.ndarray:
+    """
+    Return the indices of the set bits of a bitmap created by _pack,
+    where length is the length of the original mask.
+    """
+    bits = np.unpackbits(bitmap.view(np.uint8), count=length, bitorder="little")
+    return np.flatnonzero(bits)
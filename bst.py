@@ -12,7 +12,9 @@ This file is Copyright (c) 2021 Aditya Mehrotra.
 """
 
 from __future__ import annotations
-from typing import Optional, Any, List, Tuple
+from itertools import accumulate, islice
+from typing import Optional, Any, List, Tuple, Sequence, Iterator, Dict
+from metrics import METRICS
 
 
 class BinarySearchTree:
@@ -24,18 +26,33 @@ class BinarySearchTree:
         a stat of a pokemon
         -  pokemon: The pokemon stored in this tree, where the stat
         comes from
+        - stats: The other stats of the pokemon, in the order of the stat_names
+        of the whole tree, None if they are not stored
+        - stat_names: The names of the stats stored with every pokemon of this
+        tree, only set on the root of a tree built by from_sorted
         - _left: the left subtree
         - _right: the right subtree
+        - _height: the height of this tree, 0 if this tree is empty
+        - _size: the number of pokemon in this tree, 0 if this tree is empty
+        - _sum: the sum of the stats in this tree, 0 if this tree is empty
 
         Representation Invariants:
         - self._left.root <= self._root <= self._right._root
         - self.pokemon != self._right.pokemon
         - self.pokemon != self._left.pokemon
+        - self.is_empty() or abs(self._left._height - self._right._height) <= 1
+        - self.is_empty() or self._size == self._left._size + 1 + self._right._size
+        - self.is_empty() or self._sum == self._left._sum + self._root + self._right._sum
     """
     _root: Optional[Any]
     pokemon: Optional[str]
+    stats: Optional[Tuple[Any, ...]]
+    stat_names: Tuple[str, ...]
     _left: Optional[Any]
     _right: Optional[Any]
+    _height: int
+    _size: int
+    _sum: Any
 
     def __init__(self, root: Optional[Any], pokemon: Optional[str]) -> None:
         """Initialize a new BST containing only the given root value
@@ -43,25 +60,92 @@ class BinarySearchTree:
 
         If <root> is None, initialize an empty BST.
         """
+        self.stats = None
+        self.stat_names = ()
         if root is None:
             self._root = None
             self.pokemon = pokemon
             self._left = None
             self._right = None
+            self._height = 0
+            self._size = 0
+            self._sum = 0
         else:
             self._root = root
             self.pokemon = pokemon
             self._left = BinarySearchTree(None, None)  # self._left is an empty BST
             self._right = BinarySearchTree(None, None)  # self._right is an empty BST
+            self._height = 1
+            self._size = 1
+            self._sum = root
+
+    @classmethod
+    def from_sorted(cls, items: Sequence[Any], pokemon: Sequence[str],
+                    stats: Optional[Dict[str, Sequence[Any]]] = None) -> BinarySearchTree:
+        """Build a height-balanced BST from stat values that are sorted in
+        ascending order, where pokemon[i] is the pokemon with stat items[i].
+        If stats is given, stats[stat][i] is another stat of pokemon[i], which is
+        stored with it so that stat can be aggregated too.
+
+        The tree is built without recursion in O(n) time, so there is no
+        depth limit on the size of the input.
+
+        Preconditions:
+            - len(items) == len(pokemon)
+            - stats is None or all(len(column) == len(items) for column in stats.values())
+            - all(items[i] <= items[i + 1] for i in range(len(items) - 1))
+
+        >>> bst = BinarySearchTree.from_sorted([1, 2, 3, 4, 5], ["a", "b", "c", "d", "e"])
+        >>> bst._root
+        3
+        >>> bst._left._root
+        2
+        >>> bst._right._root
+        5
+        >>> bst._height
+        3
+        """
+        tree = cls(None, None)
+        prefix_sums = list(accumulate(items, initial=0))
+        rows = None
+        if stats:
+            tree.stat_names = tuple(stats)
+            rows = list(zip(*stats.values()))
+
+        # Each stack entry is an empty subtree and the slice of items it should hold
+        stack = [(tree, 0, len(items))]
+        while stack:
+            subtree, start, end = stack.pop()
+
+            if start < end:
+                middle = (start + end) // 2
+                subtree._root = items[middle]
+                subtree.pokemon = pokemon[middle]
+                subtree.stats = None if rows is None else rows[middle]
+                subtree._left = BinarySearchTree(None, None)
+                subtree._right = BinarySearchTree(None, None)
+                # A tree built by always splitting at the middle has this exact height
+                subtree._height = (end - start).bit_length()
+                subtree._size = end - start
+                subtree._sum = prefix_sums[end] - prefix_sums[start]
+
+                stack.append((subtree._left, start, middle))
+                stack.append((subtree._right, middle + 1, end))
+
+        return tree
 
     def is_empty(self) -> bool:
         """Return whether this BST is empty.
         """
         return self._root is None
 
-    def insert(self, item: Any, pokemon: str) -> None:
+    def insert(self, item: Any, pokemon: str, stats: Optional[Tuple[Any, ...]] = None) -> None:
         """Insert the given pokemon and stat
-        from the pokemon into this tree.
+        from the pokemon into this tree, and its other stats (in the order of
+        self.stat_names), which are required when the tree stores other stats.
+
+        Raise a ValueError if the tree stores other stats and stats does not
+        hold exactly one value for each of them.
 
         Do not change positions of any other values.
 
@@ -80,17 +164,113 @@ class BinarySearchTree:
         'pikachu'
         >>> bst._right.pokemon
         'charizard'
+
+        The tree rebalances itself (AVL rotations) after every insertion,
+        so inserting sorted values does not create a lopsided tree.
+
+        >>> bst = BinarySearchTree(1, pokemon="a")
+        >>> bst.insert(2, "b")
+        >>> bst.insert(3, "c")
+        >>> bst._root
+        2
+        >>> bst._left._root
+        1
+        >>> bst._right._root
+        3
+
+        A tree that stores other stats needs them for every pokemon.
+
+        >>> bst = BinarySearchTree.from_sorted([1, 2], ["a", "b"], {"speed": [7, 8]})
+        >>> bst.insert(3, "c")
+        Traceback (most recent call last):
+        ...
+        ValueError: this tree stores the stats ('speed',), but c was given None
+        >>> bst.insert(3, "c", (9,))
+        >>> bst.items(0, 3, "speed")
+        [(7, 'a'), (8, 'b'), (9, 'c')]
         """
-        if self.is_empty():
+        if self.stat_names and (stats is None or len(stats) != len(self.stat_names)):
+            raise ValueError(f"this tree stores the stats {self.stat_names}, but {pokemon} was given {stats}")
 
-            self._root = item
-            self.pokemon = pokemon
-            self._left = BinarySearchTree(None, None)
-            self._right = BinarySearchTree(None, None)
-        elif item <= self._root:
-            self._left.insert(item, pokemon)
+        # Walk down to the empty subtree where the item belongs, remembering
+        # the path so that it can be rebalanced bottom-up afterwards
+        path = []
+        subtree = self
+        while not subtree.is_empty():
+            path.append(subtree)
+            if item <= subtree._root:
+                subtree = subtree._left
+            else:
+                subtree = subtree._right
+
+        subtree._root = item
+        subtree.pokemon = pokemon
+        subtree.stats = stats
+        subtree._left = BinarySearchTree(None, None)
+        subtree._right = BinarySearchTree(None, None)
+        subtree._height = 1
+        subtree._size = 1
+        subtree._sum = item
+
+        for ancestor in reversed(path):
+            ancestor._rebalance()
+
+    def _update_height(self) -> None:
+        """Recompute the height, size and sum of this (non-empty) tree from its subtrees.
+        """
+        self._height = 1 + max(self._left._height, self._right._height)
+        self._size = self._left._size + 1 + self._right._size
+        self._sum = self._left._sum + self._root + self._right._sum
+
+    def _rebalance(self) -> None:
+        """Restore the AVL balance of this (non-empty) tree, assuming
+        both of its subtrees are already balanced.
+        """
+        balance = self._left._height - self._right._height
+
+        if balance > 1:
+            if self._left._left._height < self._left._right._height:
+                self._left._rotate_left()
+            self._rotate_right()
+        elif balance < -1:
+            if self._right._right._height < self._right._left._height:
+                self._right._rotate_right()
+            self._rotate_left()
         else:
-            self._right.insert(item, pokemon)
+            self._update_height()
+
+    def _rotate_right(self) -> None:
+        """Rotate this tree to the right, in place.
+
+        The rotation swaps the contents of this tree and its left subtree
+        rather than relinking the parent, so any tree holding a reference
+        to this one stays valid.
+        """
+        pivot = self._left
+        self._root, pivot._root = pivot._root, self._root
+        self.pokemon, pivot.pokemon = pivot.pokemon, self.pokemon
+        self.stats, pivot.stats = pivot.stats, self.stats
+
+        self._left, pivot._left, pivot._right, self._right = \
+            pivot._left, pivot._right, self._right, pivot
+
+        pivot._update_height()
+        self._update_height()
+
+    def _rotate_left(self) -> None:
+        """Rotate this tree to the left, in place. This is the mirror
+        image of _rotate_right.
+        """
+        pivot = self._right
+        self._root, pivot._root = pivot._root, self._root
+        self.pokemon, pivot.pokemon = pivot.pokemon, self.pokemon
+        self.stats, pivot.stats = pivot.stats, self.stats
+
+        self._right, pivot._right, pivot._left, self._left = \
+            pivot._right, pivot._left, self._left, pivot
+
+        pivot._update_height()
+        self._update_height()
 
     def find_nodes_with_constraints(self, threshold: Tuple[Optional[float], Optional[float]]) -> List[str]:
         """
@@ -123,18 +303,361 @@ class BinarySearchTree:
             A list of all pokemon names which have stat values that follow
             the constraints set out by the threshold tuple.
         """
-        lst = []
+        if METRICS.enabled:
+            return self._find_nodes_instrumented(threshold)
+        return list(self.iter_nodes_with_constraints(threshold))
+
+    def iter_nodes_with_constraints(self, threshold: Tuple[Optional[float], Optional[float]]) -> Iterator[str]:
+        """
+        A lazy version of find_nodes_with_constraints. This generator yields
+        the same pokemon names, in ascending order of stat value, one at a time.
+
+        The traversal is iterative and only holds one root-to-leaf path in memory,
+        so nothing is copied between levels of the tree, and the consumer can stop
+        early (for example with itertools.islice) without visiting the rest of the range.
+
+        >>> bst = BinarySearchTree.from_sorted([10, 20, 30, 40], ["a", "b", "c", "d"])
+        >>> results = bst.iter_nodes_with_constraints((15, None))
+        >>> next(results)
+        'b'
+        >>> list(results)
+        ['c', 'd']
+
+        :param threshold:
+            A tuple in the form (Lower bound, upper bound), where either can be none.
+            See find_nodes_with_constraints for how missing bounds are handled
+        :return:
+            An iterator over the names of all pokemon which have stat values that
+            follow the constraints set out by the threshold tuple.
+        """
+        left_threshold = 0 if threshold[0] is None else threshold[0]
+        right_threshold = 500 if threshold[1] is None else threshold[1]
+
+        stack = []
+        self._push_left_path(stack, left_threshold)
+
+        while stack:
+            subtree = stack.pop()
+
+            # Everything after this node (in order) is at least as large, so
+            # once we pass the upper bound there is nothing left to yield
+            if subtree._root > right_threshold:
+                return
+
+            if subtree._root >= left_threshold:
+                yield subtree.pokemon
+
+            subtree._right._push_left_path(stack, left_threshold)
+
+    def size(self) -> int:
+        """Return the number of pokemon in this tree.
+        """
+        return self._size
+
+    def rank(self, item: Any) -> int:
+        """Return the number of pokemon in this tree whose stat is smaller than item,
+        in O(log n) time using the subtree sizes.
+
+        >>> bst = BinarySearchTree.from_sorted([10, 20, 20, 30], ["a", "b", "c", "d"])
+        >>> bst.rank(20), bst.rank(25), bst.rank(5)
+        (1, 3, 0)
+        """
+        count = 0
+        subtree = self
+        while not subtree.is_empty():
+            if subtree._root < item:
+                count += subtree._left._size + 1
+                subtree = subtree._right
+            else:
+                subtree = subtree._left
+        return count
+
+    def select(self, position: int) -> Tuple[Any, str]:
+        """Return the stat and pokemon at the given position of this tree in
+        ascending order of stat (starting at 0), in O(log n) time.
+
+        Preconditions:
+            - 0 <= position < self.size()
+
+        >>> BinarySearchTree.from_sorted([10, 20, 30], ["a", "b", "c"]).select(2)
+        (30, 'c')
+        """
+        subtree = self
+        while True:
+            left_size = subtree._left._size
+            if position < left_size:
+                subtree = subtree._left
+            elif position == left_size:
+                return subtree._root, subtree.pokemon
+            else:
+                position -= left_size + 1
+                subtree = subtree._right
+
+    def iter_from_position(self, position: int) -> Iterator[str]:
+        """Yield the pokemon of this tree in ascending order of stat, starting
+        at the given position. Finding the start costs O(log n), and each
+        pokemon after it costs O(1) amortized.
+
+        >>> list(BinarySearchTree.from_sorted([10, 20, 30, 40], ["a", "b", "c", "d"]).iter_from_position(1))
+        ['b', 'c', 'd']
+        """
+        for subtree in self._iter_subtrees_from_position(position):
+            yield subtree.pokemon
+
+    def items(self, start: int, end: int, stat: Optional[str] = None) -> List[Tuple[Any, str]]:
+        """Return the (stat, pokemon) pairs at positions start to end - 1 of this
+        tree in ascending order of stat, in O(log n + end - start) time. If stat
+        is given, the pairs hold that stat of each pokemon instead.
+
+        >>> BinarySearchTree.from_sorted([10, 20, 30, 40], ["a", "b", "c", "d"]).items(1, 3)
+        [(20, 'b'), (30, 'c')]
+        """
+        return list(self.iter_items(start, end, stat))
+
+    def iter_items(self, start: int, end: int, stat: Optional[str] = None) -> Iterator[Tuple[Any, str]]:
+        """A lazy version of items, which costs O(log n) to start and O(1)
+        amortized for every pair after the first.
+        """
+        subtrees = islice(self._iter_subtrees_from_position(start), max(0, end - start))
+        if stat is None:
+            return ((subtree._root, subtree.pokemon) for subtree in subtrees)
+        position = self.stat_names.index(stat)
+        return ((subtree.stats[position], subtree.pokemon) for subtree in subtrees)
+
+    def position_range(self, threshold: Tuple[Optional[float], Optional[float]]) -> Tuple[int, int]:
+        """Return the (start, end) positions, in ascending order of stat, of the pokemon
+        find_nodes_with_constraints would return, in O(log n) time.
+
+        >>> BinarySearchTree.from_sorted([10, 20, 30, 40], ["a", "b", "c", "d"]).position_range((15, 30))
+        (1, 3)
+        """
+        left_threshold = 0 if threshold[0] is None else threshold[0]
+        right_threshold = 500 if threshold[1] is None else threshold[1]
+        start, _ = self._count_and_sum_below(left_threshold, inclusive=False)
+        end, _ = self._count_and_sum_below(right_threshold, inclusive=True)
+        return start, max(start, end)
+
+    def _iter_subtrees_from_position(self, position: int) -> Iterator[BinarySearchTree]:
+        """Yield the non-empty subtrees of this tree in order, starting at the given position.
+        """
+        # Build the stack an in-order traversal would have when it reaches position
+        stack = []
+        subtree = self
+        while not subtree.is_empty():
+            left_size = subtree._left._size
+            if position <= left_size:
+                stack.append(subtree)
+                subtree = subtree._left
+            else:
+                position -= left_size + 1
+                subtree = subtree._right
+
+        while stack:
+            subtree = stack.pop()
+            yield subtree
+            subtree._right._push_left_path(stack, float("-inf"))
+
+    def find_top(self, k: int) -> List[str]:
+        """Return the k pokemon with the highest stats, highest first, in O(log n + k) time.
+        Pokemon with equal stats are in the reverse of their ascending order.
+
+        >>> BinarySearchTree.from_sorted([10, 20, 30, 40], ["a", "b", "c", "d"]).find_top(2)
+        ['d', 'c']
+        """
+        k = min(k, self._size)
+        top = list(islice(self.iter_from_position(self._size - k), k))
+        top.reverse()
+        return top
+
+    def find_bottom(self, k: int) -> List[str]:
+        """Return the k pokemon with the lowest stats, lowest first, in O(log n + k) time.
+
+        >>> BinarySearchTree.from_sorted([10, 20, 30, 40], ["a", "b", "c", "d"]).find_bottom(3)
+        ['a', 'b', 'c']
+        """
+        return list(islice(self.iter_from_position(0), k))
+
+    def aggregate(self, threshold: Tuple[Optional[float], Optional[float]], function: str,
+                  target_stat: Optional[str] = None) -> Optional[float]:
+        """
+        Aggregates the stats of the pokemon that find_nodes_with_constraints would
+        return, without visiting them. The count, sum and mean come from the subtree
+        sizes and sums along two root-to-leaf paths, and the min and max from one
+        path each, so every aggregate costs O(log n).
+
+        Another stat of the same pokemon (target_stat) has no subtree sums, so
+        aggregating it visits every pokemon in the range, in O(log n + k) time.
+
+        >>> bst = BinarySearchTree.from_sorted([10, 20, 30, 40], ["a", "b", "c", "d"],
+        ...                                    {"hp": [4, 3, 2, 1]})
+        >>> [bst.aggregate((15, 40), function) for function in ["count", "sum", "mean", "min", "max"]]
+        [3, 90, 30.0, 20, 40]
+        >>> bst.aggregate((41, None), "mean") is None
+        True
+        >>> bst.aggregate((15, 40), "sum", "hp"), bst.aggregate((15, 40), "max", "hp")
+        (6, 3)
+
+        Preconditions:
+            - function in {"count", "sum", "mean", "min", "max"}
+            - target_stat is None or target_stat in self.stat_names
+
+        :param threshold:
+            A tuple in the form (Lower bound, upper bound), where either can be none.
+            See find_nodes_with_constraints for how missing bounds are handled
+        :param function:
+            The aggregate to compute
+        :param target_stat:
+            The stat to aggregate, if it is not the stat this tree is ordered by
+        :return:
+            The aggregate of the stats in the range. The count and sum of an empty range
+            are 0, and its mean, min and max are None.
+        """
+        if target_stat is not None:
+            values = [stat for stat, _ in self.items(*self.position_range(threshold), target_stat)]
+            if function == "count":
+                return len(values)
+            elif function == "sum":
+                return sum(values)
+            elif len(values) == 0:
+                return None
+            elif function == "mean":
+                return sum(values) / len(values)
+            return min(values) if function == "min" else max(values)
+
+        left_threshold = 0 if threshold[0] is None else threshold[0]
+        right_threshold = 500 if threshold[1] is None else threshold[1]
+
+        if function == "min" or function == "max":
+            value = self._ceiling(left_threshold) if function == "min" else self._floor(right_threshold)
+            if value is None or not left_threshold <= value <= right_threshold:
+                return None
+            return value
+
+        below_count, below_sum = self._count_and_sum_below(left_threshold, inclusive=False)
+        upto_count, upto_sum = self._count_and_sum_below(right_threshold, inclusive=True)
+        count, total = upto_count - below_count, upto_sum - below_sum
+        if count <= 0:
+            count, total = 0, 0
+
+        if function == "count":
+            return count
+        elif function == "sum":
+            return total
+        else:
+            assert function == "mean"
+            return total / count if count > 0 else None
+
+    def _count_and_sum_below(self, item: Any, inclusive: bool) -> Tuple[int, Any]:
+        """Return the number and sum of the stats in this tree that are smaller
+        than item (or at most item, if inclusive).
+        """
+        count, total = 0, 0
+        subtree = self
+        while not subtree.is_empty():
+            if subtree._root < item or (inclusive and subtree._root == item):
+                count += subtree._left._size + 1
+                total += subtree._left._sum + subtree._root
+                subtree = subtree._right
+            else:
+                subtree = subtree._left
+        return count, total
+
+    def _ceiling(self, item: Any) -> Optional[Any]:
+        """Return the smallest stat in this tree that is at least item, or None if there is none.
+        """
+        ceiling = None
+        subtree = self
+        while not subtree.is_empty():
+            if subtree._root >= item:
+                ceiling = subtree._root
+                subtree = subtree._left
+            else:
+                subtree = subtree._right
+        return ceiling
+
+    def _floor(self, item: Any) -> Optional[Any]:
+        """Return the largest stat in this tree that is at most item, or None if there is none.
+        """
+        floor = None
+        subtree = self
+        while not subtree.is_empty():
+            if subtree._root <= item:
+                floor = subtree._root
+                subtree = subtree._right
+            else:
+                subtree = subtree._left
+        return floor
 
+    def _find_nodes_instrumented(self, threshold: Tuple[Optional[float], Optional[float]]) -> List[str]:
+        """
+        The same traversal as iter_nodes_with_constraints, which also records
+        how many nodes it visits and the depth of the deepest one in METRICS.
+        It is only used while metrics are enabled, so the usual traversal does
+        not pay for the bookkeeping.
+        """
         left_threshold = 0 if threshold[0] is None else threshold[0]
         right_threshold = 500 if threshold[1] is None else threshold[1]
+        results = []
+        visited = 0
+        deepest = 0
+
+        # Each stack entry is a non-empty subtree and its depth (the root has depth 1)
+        stack = []
 
-        if not self._left.is_empty() and self._root >= left_threshold:
-            lst.extend(self._left.find_nodes_with_constraints(threshold))
+        def push_left_path(subtree: BinarySearchTree, depth: int) -> None:
+            while not subtree.is_empty():
+                stack.append((subtree, depth))
+                if subtree._root < left_threshold:
+                    break
+                subtree = subtree._left
+                depth += 1
 
-        if left_threshold <= self._root <= right_threshold:
-            lst.extend([self.pokemon])
+        push_left_path(self, 1)
+        while stack:
+            subtree, depth = stack.pop()
+            visited += 1
+            deepest = max(deepest, depth)
 
-        if not self._right.is_empty() and self._root <= right_threshold:
-            lst.extend(self._right.find_nodes_with_constraints(threshold))
+            if subtree._root > right_threshold:
+                break
+            if subtree._root >= left_threshold:
+                results.append(subtree.pokemon)
+            push_left_path(subtree._right, depth + 1)
 
-        return lst
\ No newline at end of file
+        METRICS.record_traversal(visited, deepest)
+        return results
+
+    def shape(self) -> Dict[str, int]:
+        """
+        Return the shape of this tree: its number of nodes, its height, the
+        smallest height a tree with as many nodes could have, and the largest
+        difference between the heights of the two subtrees of any node.
+
+        >>> BinarySearchTree.from_sorted([1, 2, 3, 4], ["a", "b", "c", "d"]).shape()
+        {'nodes': 4, 'height': 3, 'min_height': 3, 'max_imbalance': 1}
+        """
+        nodes = 0
+        max_imbalance = 0
+        stack = [self]
+        while stack:
+            subtree = stack.pop()
+            if not subtree.is_empty():
+                nodes += 1
+                max_imbalance = max(max_imbalance, abs(subtree._left._height - subtree._right._height))
+                stack.append(subtree._left)
+                stack.append(subtree._right)
+
+        return {"nodes": nodes, "height": self._height, "min_height": nodes.bit_length(),
+                "max_imbalance": max_imbalance}
+
+    def _push_left_path(self, stack: List[BinarySearchTree], left_threshold: float) -> None:
+        """Push this tree and its chain of left subtrees onto stack, stopping
+        early once a root is smaller than left_threshold (nothing further left
+        can be in range).
+        """
+        subtree = self
+        while not subtree.is_empty():
+            stack.append(subtree)
+            if subtree._root < left_threshold:
+                break
+            subtree = subtree._left
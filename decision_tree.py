@@ -8,8 +8,18 @@ This file is Copyright (c) 2021 Aditya Mehrotra.
 """
 from __future__ import annotations
 
-from typing import Union, Optional, List, Dict
+import heapq
+import time
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Union, Optional, List, Dict, Iterable, Sequence, Iterator, Tuple, TYPE_CHECKING
 from bst import BinarySearchTree
+from sorted_index import SortedArrayIndex
+from query_cache import QueryCache
+from metrics import METRICS
+
+if TYPE_CHECKING:
+    from answer_table import AnswerTable
 
 
 class DecisionTree:
@@ -18,22 +28,31 @@ class DecisionTree:
 
 
     Private Instance Attributes:
-    - subtrees: A list of subtrees of the decision tree
+    - subtrees: A list of subtrees of the decision tree, the subtree of a binary
+      parent is a range index (a BST or a SortedArrayIndex)
     - category: The item that this decision tree represents
       for this project, the category can be a pokemon type or stat
     - _is_binary_parent: Whether this decision tree is a parent to a BST
     - conversion_dictionary: The dictionary used to convert the degree
       of a query into a numerical representation (see more in the project report)
+    - version: A fingerprint of the dataset and thresholds this tree was built from,
+      None if it is unknown
+    - cache: A cache of evaluated query results, None if results are not cached
+    - answer_table: A materialized table of every query's answer, None if
+      queries are always evaluated on the tree
 
     Representation invariants:
     - category in {'flying', 'ice', 'psychic', 'ghost', 'water', 'ground', 'steel',
     'rock', 'fighting', 'fire', 'electric', 'poison', 'grass', 'bug', 'dark', 'normal', 'fairy',
     'dragon', 'attack', 'defense', 'sp_attack', 'sp_defense', 'hp', 'speed}
     """
-    subtrees: List[Union[BinarySearchTree, DecisionTree]]
+    subtrees: List[Union[BinarySearchTree, SortedArrayIndex, DecisionTree]]
     category: str
     _is_binary_parent: bool
     conversion_dictionary: Optional[Dict[str, tuple[Optional[float], Optional[float]]]]
+    version: Optional[str]
+    cache: Optional[QueryCache]
+    answer_table: Optional[AnswerTable]
 
     def __init__(self, category: Optional[str], is_binary_parent: bool,
                  conversion_dictionary: Optional[Dict[str, tuple[Optional[float], Optional[float]]]]) -> None:
@@ -41,35 +60,362 @@ class DecisionTree:
         self.category = category
         self._is_binary_parent = is_binary_parent
         self.conversion_dictionary = conversion_dictionary
+        self.version = None
+        self.cache = None
+        self.answer_table = None
 
         # Tree can only have a query conversion dictionary if the subtree is a binary tree.
         assert conversion_dictionary is None or self._is_binary_parent
 
-    def add_subtree(self, subtree: Union[BinarySearchTree, DecisionTree]) -> None:
+    def add_subtree(self, subtree: Union[BinarySearchTree, SortedArrayIndex, DecisionTree]) -> None:
         """
         Adds a subtree to this decision tree
 
         :param subtree:
-            A BST or decision tree to add as a subtree to this decision tree
+            A BST, sorted-array index or decision tree to add as a subtree to this decision tree
         """
         self.subtrees.append(subtree)
 
-    def evaluate(self, query: List[str]) -> List[str]:
+    def set_cache(self, cache: Optional[QueryCache]) -> None:
+        """
+        Caches the results of queries evaluated on this decision tree. The cache
+        is keyed on the query and tagged with self.version, so results cached
+        for a different dataset or different thresholds are never returned.
+
+        :param cache:
+            The cache to use, or None to stop caching
+        """
+        self.cache = cache
+
+    def set_answer_table(self, answer_table: Optional[AnswerTable]) -> None:
+        """
+        Answers queries from a materialized answer table instead of the tree.
+        The table is only used once it has been built, and only if it was
+        built from the same dataset and thresholds as this tree.
+
+        :param answer_table:
+            The answer table to use, or None to always evaluate on the tree
+        """
+        self.answer_table = answer_table
+
+    def _lookup_answer_table(self, query: List[str]) -> Optional[Sequence[str]]:
+        """
+        Return the answer to query from the answer table, or None if there is
+        no usable answer table.
+        """
+        if self.answer_table is None or self.answer_table.version != self.version:
+            return None
+        return self.answer_table.lookup(query)
+
+    def evaluate(self, query: List[str]) -> Sequence[str]:
         """
         Evaluates this decision tree on a given query. If the decision
-        tree has a BST child, then the evaluate method will call the
-        BST find_nodes_with_constraints function. But if there is not BST
+        tree has a BST (or sorted-array index) child, then the evaluate method will call
+        its find_nodes_with_constraints function. But if there is not BST
         child, then it will recurse onto a decision tree.
 
         :param query:
             A list of strings, where each string is a keyword.
         :return:
-            The result after evaluating the query
+            The result after evaluating the query. When a cache is set, the same
+            result object is returned for repeated queries, so it must not be mutated
+        """
+        if METRICS.enabled:
+            start = time.perf_counter()
+            result = self._evaluate_with_cache(query)
+            METRICS.observe("query latency", time.perf_counter() - start)
+            return result
+        return self._evaluate_with_cache(query)
+
+    def _evaluate_with_cache(self, query: List[str]) -> Sequence[str]:
+        """
+        Evaluates this decision tree on a given query, using the answer table
+        and the cache when they are set.
+        """
+        answer = self._lookup_answer_table(query)
+        if answer is not None:
+            return answer
+
+        if self.cache is not None:
+            return self.cache.get_or_compute(_cache_key(query), self.version, lambda: self._evaluate(query))
+        return self._evaluate(query)
+
+    def _evaluate(self, query: List[str]) -> Sequence[str]:
+        """
+        Evaluates this decision tree on a given query, without using the cache.
         """
         if not self._is_binary_parent:
+            if query[0] == "all":
+                return [name for _, name in self._union_items(query[1:])]
             for item in self.subtrees:
                 if item.category == query[0]:
-                    return item.evaluate(query[1:])
+                    return item._evaluate(query[1:])
         elif self._is_binary_parent:
             assert len(query) == 1
-            return self.subtrees[0].find_nodes_with_constraints(self.conversion_dictionary[query[0]])
\ No newline at end of file
+            ranking = _parse_ranking(query[0])
+            if ranking is not None:
+                direction, k = ranking
+                return self.subtrees[0].find_top(k) if direction == "top" else self.subtrees[0].find_bottom(k)
+            return self.subtrees[0].find_nodes_with_constraints(self.conversion_dictionary[query[0]])
+
+    def iter_evaluate(self, query: List[str], limit: Optional[int] = None) -> Iterator[str]:
+        """
+        A lazy version of evaluate. The results are yielded one at a time in
+        ascending order of stat value, so a caller can show the first page of
+        results without materializing the whole set.
+
+        :param query:
+            A list of strings, where each string is a keyword.
+        :param limit:
+            The maximum number of results to yield, or None for no limit
+        :return:
+            An iterator over the result of evaluating the query
+        """
+        answer = self._lookup_answer_table(query)
+        if answer is not None:
+            return islice(iter(answer), limit)
+
+        # On a cache miss the result is still streamed from the index, and it is
+        # only cached once the caller has iterated over all of it
+        if self.cache is not None:
+            key = _cache_key(query)
+            cached = self.cache.get(key, self.version)
+            if cached is not None:
+                return islice(iter(cached), limit)
+            return islice(self._cache_when_complete(key, self._iter_evaluate(query)), limit)
+
+        return self._iter_evaluate(query, limit)
+
+    def _iter_evaluate(self, query: List[str], limit: Optional[int] = None) -> Iterator[str]:
+        """
+        A lazy version of evaluate, without using the answer table or the cache.
+        """
+        if not self._is_binary_parent:
+            if query[0] == "all":
+                # The union is merged and deduplicated only as far as the caller iterates
+                return islice((name for _, name in self._union_items(query[1:])), limit)
+            for item in self.subtrees:
+                if item.category == query[0]:
+                    return item._iter_evaluate(query[1:], limit)
+            return iter([])
+        else:
+            assert len(query) == 1
+            if _parse_ranking(query[0]) is not None:
+                return islice(iter(self._evaluate(query)), limit)
+            results = self.subtrees[0].iter_nodes_with_constraints(self.conversion_dictionary[query[0]])
+            return islice(results, limit)
+
+    def _cache_when_complete(self, key: Tuple[str, ...], results: Iterator[str]) -> Iterator[str]:
+        """
+        Yield every result, and cache the full result once the last one has been
+        yielded. If the caller stops early, nothing is cached.
+        """
+        collected = []
+        for name in results:
+            collected.append(name)
+            yield name
+        self.cache.put(key, self.version, collected)
+
+    def aggregate(self, query: List[str], function: str, target_stat: Optional[str] = None) -> Optional[float]:
+        """
+        Aggregates the stat of the pokemon that evaluate would return for a query,
+        without building the list of their names (see BinarySearchTree.aggregate).
+        The answer table and cache hold result lists, so they are not used.
+
+        Preconditions:
+            - function in {"count", "sum", "mean", "min", "max"}
+
+        :param query:
+            A list of strings, where each string is a keyword, as for evaluate
+        :param function:
+            The aggregate to compute
+        :param target_stat:
+            The stat to aggregate, if it is not the stat the query filters on
+            (ex: the attack of the pokemon with a medium speed)
+        :return:
+            The aggregate of the stat over the pokemon the query returns. For a type
+            that has no pokemon the count and sum are 0, and the mean, min and max are None.
+        """
+        if target_stat == self.category:
+            target_stat = None
+
+        if not self._is_binary_parent:
+            if query[0] == "all":
+                if target_stat is None or target_stat == query[1]:
+                    stats = [stat for stat, _ in self._union_items(query[1:])]
+                else:
+                    # The target stats are not in order, so every one is compared
+                    stats = sorted(stat for stat, _ in _distinct_items(
+                        pair for item in self.subtrees for pair in item._items(query[1:], target_stat)))
+                if function == "count":
+                    return len(stats)
+                elif function == "sum":
+                    return sum(stats)
+                elif len(stats) == 0:
+                    return None
+                elif function == "mean":
+                    return sum(stats) / len(stats)
+                return stats[0] if function == "min" else stats[-1]
+            for item in self.subtrees:
+                if item.category == query[0]:
+                    return item.aggregate(query[1:], function, target_stat)
+            return 0 if function in {"count", "sum"} else None
+        else:
+            assert len(query) == 1
+            return self.subtrees[0].aggregate(self.conversion_dictionary[query[0]], function, target_stat)
+
+    def _union_items(self, query: List[str]) -> Iterator[Tuple[Any, str]]:
+        """
+        Evaluates a query on every type below this decision tree and yields the
+        union of the results, as (stat, pokemon) pairs. A pokemon with two types
+        is only yielded once. Each type answers with its own thresholds, and the
+        results of every type are merged in ascending order of stat (descending
+        for a "top k" query), so a "top k" or "bottom k" query only needs the
+        first k pokemon of every type.
+
+        The pairs are merged lazily, so a caller that stops early only pays for
+        the pairs it has taken.
+
+        :param query:
+            A query without its type, such as ["attack", "high attack"] or ["attack", "top 10"]
+        :return:
+            An iterator over the (stat, pokemon) pairs of the union, in the same order
+            as the pokemon a query on a single type returns
+        """
+        ranking = _parse_ranking(query[-1])
+        item_iterators = [item._iter_items(query) for item in self.subtrees]
+        merged = heapq.merge(*item_iterators, key=itemgetter(0),
+                             reverse=ranking is not None and ranking[0] == "top")
+
+        distinct = _distinct_items(merged)
+        return distinct if ranking is None else islice(distinct, ranking[1])
+
+    def _iter_items(self, query: List[str]) -> Iterator[Tuple[Any, str]]:
+        """
+        A lazy version of _items, without a target stat.
+        """
+        if not self._is_binary_parent:
+            for item in self.subtrees:
+                if item.category == query[0]:
+                    return item._iter_items(query[1:])
+            return iter([])
+
+        if _parse_ranking(query[0]) is not None:
+            # A ranked query returns at most k pairs
+            return iter(self._items(query))
+        index = self.subtrees[0]
+        start, end = index.position_range(self.conversion_dictionary[query[0]])
+        return index.iter_items(start, end)
+
+    def _items(self, query: List[str], target_stat: Optional[str] = None) -> List[Tuple[Any, str]]:
+        """
+        Evaluates a query without its type on this (type) decision tree, and
+        returns the (stat, pokemon) pairs of the result. If target_stat is given,
+        the pairs hold that stat of each pokemon instead of the stat of the query.
+        """
+        if target_stat == self.category:
+            target_stat = None
+
+        if not self._is_binary_parent:
+            for item in self.subtrees:
+                if item.category == query[0]:
+                    return item._items(query[1:], target_stat)
+            return []
+
+        index = self.subtrees[0]
+        ranking = _parse_ranking(query[0])
+        if ranking is None:
+            start, end = index.position_range(self.conversion_dictionary[query[0]])
+            return index.items(start, end, target_stat)
+
+        direction, k = ranking
+        if direction == "bottom":
+            return index.items(0, k)
+        top = index.items(max(0, index.size() - k), index.size())
+        top.reverse()
+        return top
+
+    def index_shapes(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns the shape (see BinarySearchTree.shape) of every range index
+        in this decision tree.
+
+        :return:
+            A mapping from "type/stat" to the shape of the range index of that
+            type and stat, for every range index below this tree
+        """
+        shapes = {}
+        if self._is_binary_parent:
+            shapes[str(self.category)] = self.subtrees[0].shape()
+        else:
+            for item in self.subtrees:
+                for key, shape in item.index_shapes().items():
+                    shapes[key if self.category is None else str(self.category) + "/" + key] = shape
+        return shapes
+
+    def degrees(self) -> List[str]:
+        """
+        Returns the degrees a query on this decision tree can use, from the
+        lowest bucket of stat values to the highest.
+
+        :return:
+            The degrees in the conversion dictionary of the first binary parent below this tree
+        """
+        if self._is_binary_parent:
+            return list(dict.fromkeys(key.split(" ")[0] for key in self.conversion_dictionary))
+        for item in self.subtrees:
+            return item.degrees()
+        return []
+
+    def type_conversion_dictionaries(self) -> Dict[str, Dict[str, Tuple[Optional[float], Optional[float]]]]:
+        """
+        Returns the conversion dictionary of every pokemon type of this tree.
+        They are all the same unless the tree was built with per-type thresholds.
+
+        Preconditions:
+            - self.category is None (this is the root of a decision tree)
+
+        :return:
+            A mapping from every pokemon type to the degree to constraints mapping its queries use
+        """
+        return {type_tree.category: type_tree.subtrees[0].conversion_dictionary for type_tree in self.subtrees}
+
+
+def _parse_ranking(keyword: str) -> Optional[Tuple[str, int]]:
+    """
+    Return the (direction, k) of a ranked query keyword such as "top 10" or
+    "bottom 5", or None if the keyword is a degree.
+
+    >>> _parse_ranking("top 10")
+    ('top', 10)
+    >>> _parse_ranking("high attack") is None
+    True
+    """
+    direction, _, k = keyword.partition(" ")
+    if direction in {"top", "bottom"} and k.isdigit():
+        return direction, int(k)
+    return None
+
+
+def _distinct_items(items: Iterable[Tuple[Any, str]]) -> Iterator[Tuple[Any, str]]:
+    """
+    Yield the (stat, pokemon) pairs of items, skipping any pokemon already yielded.
+
+    >>> list(_distinct_items([(1, "a"), (2, "b"), (2, "a")]))
+    [(1, 'a'), (2, 'b')]
+    """
+    seen = set()
+    for stat, pokemon in items:
+        if pokemon not in seen:
+            seen.add(pokemon)
+            yield stat, pokemon
+
+
+def _cache_key(query: List[str]) -> Tuple[str, ...]:
+    """
+    Return the key the results of a query are cached under.
+
+    >>> _cache_key(["Fire", "attack", "high attack"])
+    ('fire', 'attack', 'high attack')
+    """
+    return tuple(keyword.lower() for keyword in query)
@@ -7,56 +7,34 @@ the pokemon recommendation GUI and processing user queries
 This file is Copyright (c) 2021 Aditya Mehrotra.
 """
 
-from typing import List, Any, Dict
+from __future__ import annotations
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from itertools import islice
+from typing import List, Any, Optional, Callable, Iterator, Tuple, TYPE_CHECKING
 import PySimpleGUI as sg
-import matplotlib.pyplot as plt
-import pandas as pd
-from process import fetch_values
+from process import create_tree_bitmap_index, create_histogram_cache, create_name_index
 from decision_tree import DecisionTree
+from bitmap_index import BitmapIndex
+from stats_store import StatsStore
+from query import AGGREGATES, QueryPlan, parse_query
+from icon_cache import IconCache
+from histogram_cache import HistogramCache
+from name_index import NameIndex
+from metrics import METRICS
+
+# The size of every pokemon icon, and a transparent (base64 GIF) image that an
+# empty party slot shows at that size, so it keeps its size when a pokemon leaves
+ICON_SIZE = (68, 56)
+BLANK_ICON = b"R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7"
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
 
 sg.theme('DarkAmber')
 
 
-def check_query(q: str) -> bool:
-    """
-    This function check if a query is valid by making sure it is in the
-    proper format. For more information about the format, please check
-    the instructions to run my program in the project report.
-
-    :param q:
-        A query
-    :return:
-        A boolean which represents if the query is valid or not
-    """
-    # This won't cause an error since q is guaranteed to not equal an
-    # empty string
-    q = q.split(" ")
-
-    # Establishing the sets which represent the valid types, stats and degrees
-    type_set = {'flying', 'ice', 'psychic', 'ghost', 'water', 'ground', 'steel',
-                'rock', 'fighting', 'fire', 'electric', 'poison', 'grass', 'bug', 'dark', 'normal', 'fairy',
-                'dragon', 'all'}
-
-    stat_set = {'attack', 'defense', 'sp_attack', 'sp_defense', 'hp', 'speed'}
-
-    degree_set = {"high", "medium", "low"}
-
-    if len(q) == 4:
-        if q[0] in {'find', 'plot'} and q[1] in type_set and \
-                q[2] in degree_set and q[3] in stat_set:
-            return True
-        else:
-            return False
-    elif len(q) == 3:
-        if q[0] in {'find', 'plot'} and q[1] in type_set and \
-                q[2] in stat_set:
-            return True
-        else:
-            return False
-    else:
-        return False
-
-
 class Gui:
     """
     A class that contains all the methods and data that is required
@@ -67,26 +45,64 @@ class Gui:
         - df: pandas dataframe after loading in our data
         - decision_tree: A decision tree used to process queries using the
         evaluate method
+        - bitmap_index: A bitmap index used to process queries with more than one
+        stat condition, built on first use if it is not given
         - pokemon_to_stats: A dictionary that returns a pokemon's stats given
         their name
-        - query: the query (after being converted to a list) give by the user
+        - query: the names of the pokemon shown on the current page of results
+        - results: the results of the current query that have been fetched so far
+        - page: the page of results being shown, starting at 0
+        - _result_source: an iterator over the results of the current query that
+        have not been fetched yet, None once every result has been fetched
+        - _executor: the worker thread that queries are evaluated on
+        - _pending_query: the most recently submitted query, None if no query was submitted
+        - _query_generation: incremented whenever a query is submitted or cancelled,
+        results of a query with an older generation are ignored
         - previous_search: Represents the last query made by the user, empty if
         no such query exists
         - party: a list of all pokemon in the party, an element in the
         list is "blank" if there is no pokemon at that position
+        - page_size: The number of results shown on each page of results
+        - icon_cache: An in-memory cache of the pokemon icons, so rebuilding the
+        window does not read them from disk again
+        - histogram_cache: The precomputed histograms plot queries are drawn
+        from, built by the first plot query if it is not given
+        - name_index: The index used to suggest pokemon names as the user types,
+        built the first time the user types a name if it is not given
+        - degrees: The degrees queries on the decision tree can use
+        - _figure: The figure plots are drawn in, None until the first plot
+        - _bars: The bars of the histogram in _figure
 
     Representation invariants:
         - len(self.party) == 6
+        - self.page_size > 0
+        - len(self.query) <= self.page_size
     """
     party: List[str]
     query: List[str]
+    results: List[str]
+    page: int
+    _result_source: Optional[Iterator[str]]
+    _executor: ThreadPoolExecutor
+    _pending_query: Optional[Future]
+    _query_generation: int
     previous_search: str
     df: pd.DataFrame
     decision_tree: DecisionTree
-    pokemon_to_stats: Dict[Any, Dict[str, Any]]
-
-    def __init__(self, df: pd.DataFrame, decision_tree: DecisionTree, pokemon_to_stats: Dict[Any, Dict[str, Any]]) \
-            -> None:
+    bitmap_index: Optional[BitmapIndex]
+    pokemon_to_stats: StatsStore
+    page_size: int
+    icon_cache: IconCache
+    histogram_cache: Optional[HistogramCache]
+    name_index: Optional[NameIndex]
+    degrees: List[str]
+    _figure: Optional[Any]
+    _bars: Optional[Any]
+
+    def __init__(self, df: pd.DataFrame, decision_tree: DecisionTree, pokemon_to_stats: StatsStore,
+                 page_size: int = 30, bitmap_index: Optional[BitmapIndex] = None,
+                 icon_cache: Optional[IconCache] = None, histogram_cache: Optional[HistogramCache] = None,
+                 name_index: Optional[NameIndex] = None) -> None:
         """
         This function initializes the necessary datatypes for generating and
         rendering the BST with the query functions.
@@ -97,21 +113,50 @@ class Gui:
             A decision tree that is used to process user queries
         :param pokemon_to_stats:
             A mapping which converts pokemon into their stats
+        :param page_size:
+            The number of results shown on each page of results
+        :param bitmap_index:
+            A bitmap index used to process queries with more than one stat condition
+        :param icon_cache:
+            A cache of the pokemon icons, a new one is created if it is not given
+        :param histogram_cache:
+            The histograms plot queries are drawn from
+        :param name_index:
+            The index used to suggest pokemon names, built from df on first use if it is not given
         """
         self.party = ["blank", "blank", "blank", "blank", "blank", "blank"]
         self.query = []
+        self.results = []
+        self.page = 0
+        self._result_source = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query")
+        self._pending_query = None
+        self._query_generation = 0
         self.previous_search = ""
+        self.page_size = page_size
+        self.icon_cache = IconCache() if icon_cache is None else icon_cache
+        self.histogram_cache = histogram_cache
+        self.name_index = name_index
+        self._figure = None
+        self._bars = None
 
         # Creating data-based variables
         self.df = df
         self.decision_tree = decision_tree
+        self.bitmap_index = bitmap_index
         self.pokemon_to_stats = pokemon_to_stats
+        self.degrees = decision_tree.degrees()
 
-    def start_gui(self) -> None:
+    def start_gui(self, on_window_ready: Optional[Callable[[], None]] = None) -> None:
         """
         This function starts the GUI's main event loop and also renders the GUI
         The loop only exits when the user closes the GUI.
 
+        The window is only created once. Queries, party changes and page changes
+        update the affected elements in place instead of rebuilding the window.
+
+        :param on_window_ready:
+            A function called once the first window has been created
         :return:
             None
         """
@@ -119,7 +164,9 @@ class Gui:
         # Create layout for the first time and render window
         layout = self.generate_layout()
         sg.theme('DarkAmber')
-        window = sg.Window('Pokemon recommender', layout, size=(600, 600))
+        window = sg.Window('Pokemon recommender', layout, size=(600, 600), finalize=True)
+        if on_window_ready is not None:
+            on_window_ready()
 
         while True:  # The Event Loop
             event, values = window.read()
@@ -129,40 +176,93 @@ class Gui:
             if event == sg.WIN_CLOSED:
                 break
 
-            # CASE: The user presses the "No action" button
-            elif event != "submit" and values[event] == "No action":
-                pass
-
             # CASE: the user submits a query
             elif event == "submit":
-                query = values["-IN-"]
+                plan = parse_query(values["-IN-"], self.degrees)
 
                 # CASE: the query is invalid, then create popup
-                if query == "" or not check_query(q=query):
+                if plan is None:
                     sg.popup("Malformed query. Please follow the query structures as outlined in the report",
                              keep_on_top=True)
 
-                # CASE: The query is valid and the query type is a plot query
-                elif query.split(" ")[0] == "plot":
-                    # Draw the graph
-                    values = query.split(" ")
+                # CASE: The query is valid, evaluate it on the worker thread
+                else:
+                    self.submit_query(window, plan)
+
+            # CASE: The user edits the query, show whether it is valid as they type
+            elif event == "-IN-":
+                plan = parse_query(values["-IN-"], self.degrees)
+                window["-PLAN-"].update("" if plan is None else "(" + plan.path + ")")
+
+            # CASE: The user cancels the query that is running
+            elif event == "cancel":
+                self._query_generation += 1  # Any result that arrives now is ignored
+                self.set_busy(window, False)
+                self.show_page(window, self.page)
+
+            # CASE: A find query finished on the worker thread
+            elif event == "-QUERY DONE-":
+                generation, query, fetched, results = values[event]
+
+                # Results of a query that was superseded or cancelled are dropped
+                if generation == self._query_generation:
                     self.previous_search = query
-                    self.draw_plot(values[2], values[1])
+                    self.set_busy(window, False)
+                    self.set_results(results, fetched)
+                    self.show_page(window, 0)
+
+            # CASE: The data of a plot query is ready
+            elif event == "-PLOT DONE-":
+                generation, query, stat, typing, histogram = values[event]
 
-                # CASE: The query is valid and the query is a pokemon search
-                elif query.split(" ")[0] == "find":
-                    # Evaluate the decision tree for the recommended pokemon
+                if generation == self._query_generation:
                     self.previous_search = query
-                    self.query = self.decision_tree.evaluate(self.process_query())
-                    layout = self.generate_layout()
+                    self.set_busy(window, False)
+                    self.show_page(window, self.page)
+                    self.draw_plot(stat, typing, histogram)
+
+            # CASE: An aggregate query finished on the worker thread
+            elif event == "-AGGREGATE DONE-":
+                generation, query, value = values[event]
+
+                if generation == self._query_generation:
+                    self.set_busy(window, False)
+                    self.show_page(window, self.page)
+                    sg.popup(query + ": " + self.format_aggregate(value), keep_on_top=True)
+
+            # CASE: A query failed on the worker thread
+            elif event == "-QUERY FAILED-":
+                generation, query, message = values[event]
+
+                if generation == self._query_generation:
+                    self.set_busy(window, False)
+                    self.show_page(window, self.page)
+                    sg.popup("The query \"" + query + "\" failed: " + message, keep_on_top=True)
+
+            # CASE: The user types in the name lookup, suggestions are updated on every keystroke
+            elif event == "-NAME-":
+                if self.name_index is None:
+                    self.name_index = create_name_index(self.df)
+                window["-SUGGESTIONS-"].update(self.name_index.suggest(values["-NAME-"], limit=10))
+
+            # CASE: The user picks a suggested pokemon, display its stats
+            elif event == "-SUGGESTIONS-":
+                if values["-SUGGESTIONS-"]:
+                    name = values["-SUGGESTIONS-"][0]
+                    sg.popup_non_blocking(self.generate_info_text(name), grab_anywhere=True,
+                                          image=self.get_icon(name))
+
+            # CASE: The user changes the page of results
+            elif event in {"previous page", "next page"}:
+                self.show_page(window, self.page + (1 if event == "next page" else -1))
 
-                    window_new = sg.Window('Pokemon recommender', layout, size=(600, 600), finalize=True)
-                    window.close()
-                    window = window_new  # Rerender window with new layout
+            # CASE: The user presses the "No action" button
+            elif values[event] == "No action":
+                pass
 
             # CASE: User has clicked on an action on a searched pokemon
             elif event.split(" ")[0] == "pokemon:":
-                name = " ".join(event.split(" ")[1:])  # Extract the name
+                name = self.query[int(event.split(" ")[1])]  # Find the name shown in the clicked slot
 
                 # CASE: The user wants the stats of the clicked pokemon
                 if values[event] == "Display Stats":
@@ -170,29 +270,21 @@ class Gui:
 
                     # Display the pokemon
                     sg.popup_non_blocking(info_text, grab_anywhere=True,
-                                          image="icons/" + str(self.pokemon_to_stats[name]["pokedex_id"]) + ".png")
+                                          image=self.get_icon(name))
                 # CASE: the user wants to add the pokemon to their party
                 elif values[event] == "Add to party":
                     if self.add_to_party(name):
-                        layout = self.generate_layout()
-
-                        window_new = sg.Window('Pokemon recommender', layout, size=(600, 600), finalize=True)
-                        window.close()
-                        window = window_new  # Rerender window
+                        self.update_party_slot(window, self.party.index(name))
 
             # CASE: The user clicked an action on a party pokemon
             elif event.split(" ")[0] == "party:":
-                name = " ".join(event.split(" ")[1:])  # Extract the name
+                slot = int(event.split(" ")[1])
+                name = self.party[slot]  # Find the name shown in the clicked slot
 
                 # CASE: The user wants to remove the pokemon from the party
                 if values[event] == "Remove from party":
                     self.remove_from_party(name)
-
-                    # Regenerate window
-                    layout = self.generate_layout()
-                    window_new = sg.Window('Pokemon recommender', layout, size=(600, 600), finalize=True)
-                    window.close()
-                    window = window_new
+                    self.update_party_slot(window, slot)
 
                 # CASE: The user wants to display the stats of the pokemon
                 elif values[event] == "Display stats":
@@ -200,45 +292,217 @@ class Gui:
                     info_text = self.generate_info_text(name)
 
                     sg.popup_non_blocking(info_text, grab_anywhere=True,
-                                          image="icons/" + str(self.pokemon_to_stats[name]["pokedex_id"]) + ".png")
+                                          image=self.get_icon(name))
 
+        self._query_generation += 1  # Drop the result of a query that is still running
+        self._executor.shutdown(wait=False)
         window.close()  # Exit when we're done
 
-    def generate_layout(self) -> List[Any]:
+    def submit_query(self, window: sg.Window, plan: QueryPlan) -> None:
         """
-        Generates a layout, which will be used to render the GUI.
+        Starts evaluating a valid find, plot or aggregate query on the worker thread, so
+        the window stays responsive. The result is delivered back to the event
+        loop as a "-QUERY DONE-", "-PLOT DONE-" or "-AGGREGATE DONE-" event. Submitting a query
+        supersedes any query that has not finished yet.
+
+        :param window:
+            The window being shown
+        :param plan:
+            The plan of a valid query
+        """
+        self._query_generation += 1
+        if self._pending_query is not None:
+            self._pending_query.cancel()  # Only succeeds if it has not started yet
+
+        self.set_busy(window, True)
+        self._pending_query = self._executor.submit(self._run_query, window, self._query_generation, plan)
+
+    def _run_query(self, window: sg.Window, generation: int, plan: QueryPlan) -> None:
+        """
+        Evaluates a query on the worker thread and posts the result to the
+        event loop, unless the query has been superseded in the meantime.
+        """
+        query = plan.text
+        start = time.perf_counter()
+        try:
+            if plan.path == "histogram":
+                if self.histogram_cache is None:
+                    self.histogram_cache = create_histogram_cache(self.df)
+                histogram = self.histogram_cache.get(plan.pokemon_type, plan.stat)
+                event, value = "-PLOT DONE-", (generation, query, plan.stat, plan.pokemon_type, histogram)
+            elif plan.action in AGGREGATES:
+                aggregate = self.decision_tree.aggregate(plan.tree_query(), plan.action, plan.target_stat)
+                event, value = "-AGGREGATE DONE-", (generation, query, aggregate)
+            else:
+                results = self.evaluate_find_query(plan)
+                # The first page (and one more result, for the Next button) is fetched here
+                fetched = list(islice(results, self.page_size + 1))
+                event, value = "-QUERY DONE-", (generation, query, fetched, results)
+        except Exception as error:  # Reported to the user instead of killing the worker
+            event, value = "-QUERY FAILED-", (generation, query, str(error))
+        if METRICS.enabled:
+            METRICS.observe("gui query latency", time.perf_counter() - start)
+
+        if generation == self._query_generation:
+            window.write_event_value(event, value)
+
+    def set_busy(self, window: sg.Window, busy: bool) -> None:
+        """
+        Shows or hides the busy state of the window while a query is running
+
+        :param window:
+            The window being shown
+        :param busy:
+            Whether a query is running
+        """
+        window["cancel"].update(disabled=not busy)
+        window.set_cursor("watch" if busy else "arrow")
+        if busy:
+            window["-PAGE-"].update("Searching...")
+
+    def evaluate_find_query(self, plan: QueryPlan) -> Iterator[str]:
+        """
+        Evaluates a find query on the path it was planned on.
 
+        :param plan:
+            The plan of a valid find query
         :return:
-            A widget layout used to render the GUI
+            A (possibly lazy) iterator over the names of the pokemon
+            that the query returns
         """
+        # Queries with several stat conditions are intersected in the bitmap index
+        if plan.path == "bitmap":
+            if self.bitmap_index is None:
+                self.bitmap_index = create_tree_bitmap_index(self.df, self.decision_tree)
+            return iter(self.bitmap_index.evaluate(plan.bitmap_query()))
+
+        # Evaluate the decision tree for the recommended (or top/bottom ranked)
+        # pokemon, results are only pulled from the tree as their pages are shown.
+        # The decision tree unions the results of every type for the type "all"
+        return self.decision_tree.iter_evaluate(plan.tree_query())
+
+    def set_results(self, results: Iterator[str], fetched: Optional[List[str]] = None) -> None:
+        """
+        Replaces the results being shown with the results of a new query
 
-        # CASE: The user has opened the GUI for the first time
-        if len(self.previous_search) == 0:
-            party = self.generate_party()
+        :param results:
+            An iterator over the names of the pokemon that the query returns
+        :param fetched:
+            The results that were already pulled from the iterator, if any
+        """
+        self.results = [] if fetched is None else fetched
+        self._result_source = results
+        self.page = 0
+        self.query = []
+        self._warm_icons(self.results)
+
+    def _warm_icons(self, names: List[str]) -> None:
+        """
+        Loads the icons of the given results in the background, so they are
+        cached by the time their page is shown.
+        """
+        self.icon_cache.warm(self.pokemon_to_stats[name]["pokedex_id"] for name in names)
+
+    def _fetch_results(self, count: int) -> None:
+        """
+        Pulls results from the current query until at least count results
+        have been fetched, or there are no results left.
+        """
+        if self._result_source is not None and len(self.results) < count:
+            self.results.extend(islice(self._result_source, count - len(self.results)))
+            if len(self.results) < count:
+                self._result_source = None  # Every result has been fetched
+
+    @METRICS.timed("render")
+    def show_page(self, window: sg.Window, page: int) -> None:
+        """
+        Shows a page of results in the result grid. Only the page_size result
+        slots exist as widgets, so this costs the same for any number of results.
+
+        :param window:
+            The window being shown
+        :param page:
+            The page to show, starting at 0
+        """
+        # Fetch the next page too, to know whether there is one and to warm its icons
+        self._fetch_results((page + 2) * self.page_size)
+
+        self.page = page
+        self.query = self.results[page * self.page_size:(page + 1) * self.page_size]
+
+        for slot in range(self.page_size):
+            element = window["pokemon: " + str(slot)]
+            if slot < len(self.query):
+                element.update(button_text=self.query[slot], image_source=self.get_icon(self.query[slot]),
+                               visible=True)
+            else:
+                element.update(visible=False)
+
+        next_page = self.results[(page + 1) * self.page_size:(page + 2) * self.page_size]
+        self._warm_icons(next_page)
+
+        has_next = len(next_page) > 0
+        window["previous page"].update(disabled=page == 0)
+        window["next page"].update(disabled=not has_next)
+        if len(self.query) == 0:
+            window["-PAGE-"].update("No pokemon found")
+        else:
+            window["-PAGE-"].update("Page " + str(page + 1))
 
-            layout = [[sg.Text('Party List:')],
-                      party,
-                      [sg.Text('Enter your query here:'), sg.Input(key='-IN-', default_text=self.previous_search),
-                       sg.Button('Submit', key="submit")]]
+    def update_party_slot(self, window: sg.Window, slot: int) -> None:
+        """
+        Updates the party element of a single slot to show the pokemon
+        that is now in that slot
+
+        :param window:
+            The window being shown
+        :param slot:
+            The position in the party that changed
+        """
+        element = window["party: " + str(slot)]
+        name = self.party[slot]
 
-        # CASE: The user has made a query before, generate searched pokemon
-        elif len(self.previous_search) > 0:
-            party = self.generate_party()
-            pokemon_list = self.generate_grid()
+        if name != "blank":
+            element.update(button_text=name, image_source=self.get_icon(name),
+                           menu_definition=['BLANK', ["Display stats", "Remove from party"]])
+        else:
+            # Replace the old pokemon's icon with the blank one
+            element.update(button_text=name, image_source=BLANK_ICON, image_size=ICON_SIZE,
+                           menu_definition=['BLANK', ["No action"]])
 
-            layout = [[sg.Text('Party List:')],
-                      party,
-                      [sg.Text('Enter your query here:'), sg.Input(key='-IN-', default_text=self.previous_search),
-                       sg.Button('Submit', key="submit")],
-                      [sg.Column(pokemon_list, scrollable=True, vertical_scroll_only=True, expand_y=True,
-                                 expand_x=True, vertical_alignment="center")]]
+    def generate_layout(self) -> List[Any]:
+        """
+        Generates a layout, which will be used to render the GUI.
+        The result grid starts out hidden, and is filled in by show_page.
+
+        :return:
+            A widget layout used to render the GUI
+        """
+        party = self.generate_party()
+        pokemon_list = self.generate_grid()
+
+        layout = [[sg.Text('Party List:')],
+                  party,
+                  [sg.Text('Enter your query here:'),
+                   sg.Input(key='-IN-', default_text=self.previous_search, size=(30, 1), enable_events=True),
+                   sg.Text('', key="-PLAN-", size=(10, 1)),
+                   sg.Button('Submit', key="submit", bind_return_key=True),
+                   sg.Button('Cancel', key="cancel", disabled=True)],
+                  [sg.Text('Look up a pokemon:'), sg.Input(key='-NAME-', size=(20, 1), enable_events=True),
+                   sg.Listbox([], key='-SUGGESTIONS-', size=(25, 3), enable_events=True)],
+                  [sg.Button('< Previous', key="previous page", disabled=True),
+                   sg.Text('', key="-PAGE-", size=(20, 1), justification="center"),
+                   sg.Button('Next >', key="next page", disabled=True)],
+                  [sg.Column(pokemon_list, scrollable=True, vertical_scroll_only=True, expand_y=True,
+                             expand_x=True, vertical_alignment="center")]]
 
         return layout
 
     def generate_grid(self) -> List[Any]:
         """
-        Generate a grid of pokemon, with max 6 pokemon per row
-        each row is represented as a nested list of ButtonMenu elements
+        Generate a grid of page_size result slots, with max 6 slots per row
+        each row is represented as a nested list of ButtonMenu elements.
+        The slots start out hidden, show_page fills them with pokemon.
 
         :return:
             A layout of ButtonMenu elements used to represent the pokemon
@@ -248,17 +512,13 @@ class Gui:
         max_row = 6
 
         temp_row = []
-        for i in range(len(self.query)):
-            filename = "icons/" + str(self.pokemon_to_stats[self.query[i]]["pokedex_id"]) \
-                       + ".png"
-
-            temp_row.append(sg.ButtonMenu(self.query[i], size=(10, 20), key="pokemon: " + self.query[i],
+        for slot in range(self.page_size):
+            temp_row.append(sg.ButtonMenu("", size=(10, 20), key="pokemon: " + str(slot),
                                           menu_def=['BLANK', ["Display Stats", "Add to party"]],
-                                          image_filename=filename,
-                                          text_color="white"))
+                                          text_color="white", visible=False))
 
-            # Reached the final pokemon or max row size
-            if len(temp_row) == max_row or i == len(self.query) - 1:
+            # Reached the max row size or the final slot
+            if len(temp_row) == max_row or slot == self.page_size - 1:
                 grid.append(temp_row)
                 temp_row = []
         return grid
@@ -274,19 +534,31 @@ class Gui:
         party_grid = []
         for i in range(len(self.party)):
             if self.party[i] != "blank":
-                filename = "icons/" + str(self.pokemon_to_stats[self.party[i]]["pokedex_id"]) \
-                           + ".png"
-
-                party_grid.append(sg.ButtonMenu(self.party[i], size=(10, 5), key="party: " + self.party[i],
+                party_grid.append(sg.ButtonMenu(self.party[i], size=(10, 5), key="party: " + str(i),
                                                 menu_def=['BLANK', ["Display stats", "Remove from party"]],
-                                                image_filename=filename,
+                                                image_data=self.get_icon(self.party[i]),
                                                 auto_size_button=True))
             elif self.party[i] == "blank":
-                party_grid.append(sg.ButtonMenu(self.party[i], size=(10, 5),
-                                                menu_def=['BLANK', ["No action"]]))
+                party_grid.append(sg.ButtonMenu(self.party[i], size=(10, 5), key="party: " + str(i),
+                                                menu_def=['BLANK', ["No action"]],
+                                                image_data=BLANK_ICON, image_size=ICON_SIZE))
 
         return party_grid
 
+    def get_icon(self, name: str) -> Optional[bytes]:
+        """
+        Returns the icon of a pokemon from the icon cache
+
+        Preconditions:
+            - name is a valid pokemon name
+
+        :param name:
+            The name of the pokemon
+        :return:
+            The base64-encoded icon, or None if the pokemon has no icon
+        """
+        return self.icon_cache.get(self.pokemon_to_stats[name]["pokedex_id"])
+
     def add_to_party(self, pokemon: str) -> bool:
         """
         Adds a pokemon to the user's party
@@ -363,43 +635,70 @@ class Gui:
                 self.party[i] = "blank"
                 break
 
-    def process_query(self) -> List[str]:
+    def format_aggregate(self, value: Optional[float]) -> str:
         """
-        Converts a query into the format required for the
-        DecisionTree to evaluate the query
+        Formats the result of an aggregate query to be shown to the user.
 
+        :param value:
+            The aggregate, or None if no pokemon matched the query
         :return:
-            A List which is formatted in the following form:
-            ["type", "stat", "degree" + " " + "stat"]
+            The aggregate, with means rounded to two decimal places
         """
-        typing, degree, stat = self.previous_search.split()[1:]
-        conversion_key = degree + " " + stat
-        return [typing, stat, conversion_key]
-
-    def draw_plot(self, stat: str, typing: str) -> None:
+        if value is None:
+            return "no pokemon match this query"
+        elif isinstance(value, float):
+            return str(round(value, 2))
+        return str(value)
+
+    def draw_plot(self, stat: str, typing: str,
+                  histogram: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> None:
         """
         This function draws a matplotlib histogram of the stat values
         of all pokemon of a certain typing
 
+        Every plot is drawn in the same figure, by moving and resizing its
+        bars, instead of closing the figure and creating a new one.
+
         :param stat:
             Desired stat used to fetch data to create the histogram
         :param typing:
             Pokemon typing that will be used to extract a subset
             of all pokemon
+        :param histogram:
+            The (counts, bin edges) of the histogram, looked up in
+            self.histogram_cache if it is not given
         :return:
             None
         """
-        # Close any open plots
-        plt.clf()
-        plt.cla()
-        plt.close()
-
-        # Generate the figure
-        plt.figure(num='Query: ' + self.previous_search)
-        lst = fetch_values(typing, stat, self.df)
-        plt.hist(lst, density=False, bins=30)
-        plt.title("A histogram of the " + stat + " of " + typing + " pokemon")
-        plt.xlabel(stat + " values")
-        plt.ylabel("Count")
-
-        plt.show(block=False)
\ No newline at end of file
+        # matplotlib is only imported by the first plot query, since most sessions never plot
+        import matplotlib.pyplot as plt
+
+        if histogram is None:
+            if self.histogram_cache is None:
+                self.histogram_cache = create_histogram_cache(self.df)
+            histogram = self.histogram_cache.get(typing, stat)
+        counts, edges = histogram
+
+        # Create the figure the first time, or again if the user closed it
+        if self._figure is None or not plt.fignum_exists(self._figure.number) \
+                or len(self._bars) != len(counts):
+            self._figure = plt.figure(num='Pokemon stats')
+            self._figure.clear()
+            axes = self._figure.add_subplot()
+            _, _, self._bars = axes.hist(edges[:-1], bins=edges, weights=counts)
+            axes.set_ylabel("Count")
+        else:
+            axes = self._figure.axes[0]
+            for bar, count, left, right in zip(self._bars, counts, edges[:-1], edges[1:]):
+                bar.set_x(left)
+                bar.set_width(right - left)
+                bar.set_height(count)
+            axes.relim()
+            axes.autoscale_view()
+
+        axes.set_title("A histogram of the " + stat + " of " + typing + " pokemon")
+        axes.set_xlabel(stat + " values")
+        self._figure.canvas.manager.set_window_title('Query: ' + self.previous_search)
+
+        self._figure.canvas.draw_idle()
+        plt.show(block=False)
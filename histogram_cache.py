@@ -0,0 +1,110 @@
+"""
+Histogram Cache Module
+===============================
+The functions/classes defined in this class are responsible for answering
+plot queries from precomputed histograms, instead of filtering the dataset
+and binning its raw stat values every time a plot is drawn.
+
+Stats are small non-negative integers, so each (type, stat) pair is first
+summarized by how many pokemon have each stat value, with one np.bincount
+per stat over every type at once. A histogram with any bin edges is then
+computed from those (at most a few hundred) value counts, so drawing a plot
+costs the same no matter how many pokemon there are.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+STATS = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
+
+
+class HistogramCache:
+    """
+    A class that represents the histograms of every stat of every pokemon type
+
+    Instance Attributes:
+        - bins: The number of bins in every histogram
+        - histograms: A mapping from (type, stat) to the (counts, bin edges) of the
+        histogram of that stat over the pokemon of that type, in the format
+        np.histogram returns. The type "all" covers every pokemon.
+
+    Representation Invariants:
+        - all(len(edges) == self.bins + 1 for _, edges in self.histograms.values())
+    """
+    bins: int
+    histograms: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]
+
+    def __init__(self, df: pd.DataFrame, type_rows: Dict[str, np.ndarray], bins: int = 30) -> None:
+        """
+        Precompute the histogram of every stat of every type.
+
+        Preconditions:
+            - every stat column of df holds non-negative integers
+
+        :param df:
+            A pandas dataframe
+        :param type_rows:
+            A mapping from every type to the positions of its rows in df, as
+            produced by group_rows_by_type
+        :param bins:
+            The number of bins in every histogram
+        """
+        self.bins = bins
+        self.histograms = {}
+
+        types = list(type_rows) + ["all"]
+        rows = np.concatenate(list(type_rows.values()) + [np.arange(len(df))])
+        codes = np.repeat(np.arange(len(types)), [len(type_rows[t]) for t in types[:-1]] + [len(df)])
+
+        for stat in STATS:
+            values = df.loc[:, stat].to_numpy().astype(np.int64)[rows]
+            width = int(values.max()) + 1 if len(values) > 0 else 1
+
+            # value_counts[t, v] is the number of pokemon of types[t] whose stat is v
+            value_counts = np.bincount(codes * width + values, minlength=len(types) * width)
+            value_counts = value_counts.reshape(len(types), width)
+            for pokemon_type, counts in zip(types, value_counts):
+                self.histograms[(pokemon_type, stat)] = _bin_value_counts(counts, bins)
+
+    def get(self, pokemon_type: str, stat: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the histogram of a stat over the pokemon of a type.
+
+        :param pokemon_type:
+            A pokemon type, or "all"
+        :param stat:
+            A stat (ex: "attack")
+        :return:
+            The (counts, bin edges) of the histogram, which is empty for a type
+            no pokemon has
+        """
+        histogram = self.histograms.get((pokemon_type, stat))
+        return np.histogram([], bins=self.bins) if histogram is None else histogram
+
+    def types(self) -> List[str]:
+        """Return every type (including "all") that has histograms.
+        """
+        return list(dict.fromkeys(pokemon_type for pokemon_type, _ in self.histograms))
+
+
+def _bin_value_counts(value_counts: np.ndarray, bins: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bins value counts (value_counts[v] pokemon have the stat value v) into a
+    histogram with the same edges plt.hist(values, bins=bins) would use: bins
+    equal-width bins from the smallest to the largest value.
+
+    >>> counts, edges = _bin_value_counts(np.array([0, 2, 0, 1]), 2)
+    >>> counts.tolist(), edges.tolist()
+    ([2, 1], [1.0, 2.0, 3.0])
+    """
+    present = np.flatnonzero(value_counts)
+    if len(present) == 0:
+        return np.histogram([], bins=bins)
+
+    edges = np.histogram_bin_edges(present, bins=bins)
+    counts, _ = np.histogram(np.arange(len(value_counts)), bins=edges, weights=value_counts)
+    return counts, edges
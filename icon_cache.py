@@ -0,0 +1,145 @@
+"""
+Icon Cache Module
+===============================
+The functions/classes defined in this class are responsible for keeping the
+pokemon icons in memory, so that rebuilding the GUI window does not read
+every icon from disk again.
+
+Icons are stored base64-encoded, which is the form PySimpleGUI (and tkinter)
+accept as image data, so a cached icon is handed to the GUI without any more
+work. The cache is bounded by the total size of the icons it holds, and a
+background thread can load icons ahead of time.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+import base64
+import os
+from collections import OrderedDict, deque
+from threading import Condition, Lock, Thread
+from typing import Deque, Dict, Iterable, Optional
+
+
+class IconCache:
+    """
+    A class that represents a least-recently-used cache of encoded pokemon icons
+
+    Instance Attributes:
+        - directory: The directory the icons are read from, the icon of the
+        pokemon with pokedex id i is <directory>/<i>.png
+        - max_bytes: The maximum total size of the cached icons
+        - hits: The number of icons returned from the cache
+        - misses: The number of icons that had to be read from disk
+
+    Private Instance Attributes:
+        - _icons: The cached icons by pokedex id, from least to most recently used
+        - _size: The total size of the cached icons
+        - _lock: A lock guarding the cache, which is shared with the warming thread
+        - _pending: The pokedex ids waiting to be loaded by the warming thread
+        - _pending_ready: Signals the warming thread that there are pending ids
+        - _worker: The warming thread, None until warm is first called
+
+    Representation Invariants:
+        - self._size <= self.max_bytes
+    """
+    directory: str
+    max_bytes: int
+    hits: int
+    misses: int
+    _icons: OrderedDict
+    _size: int
+    _lock: Lock
+    _pending: Deque[int]
+    _pending_ready: Condition
+    _worker: Optional[Thread]
+
+    def __init__(self, directory: str = "icons", max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._icons = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self._pending = deque()
+        self._pending_ready = Condition()
+        self._worker = None
+
+    def get(self, pokedex_id: int) -> Optional[bytes]:
+        """
+        Return the base64-encoded icon of a pokemon, reading it from disk
+        if it is not cached.
+
+        :param pokedex_id:
+            The pokedex id of the pokemon
+        :return:
+            The encoded icon, or None if the pokemon has no icon
+        """
+        with self._lock:
+            icon = self._icons.get(pokedex_id)
+            if icon is not None:
+                self.hits += 1
+                self._icons.move_to_end(pokedex_id)
+                return icon
+            self.misses += 1
+
+        return self._load(pokedex_id)
+
+    def warm(self, pokedex_ids: Iterable[int]) -> None:
+        """
+        Load icons into the cache on a background thread. Icons passed to a
+        later call are loaded before icons that are still waiting from an
+        earlier call, so the most recent query's icons come first.
+
+        :param pokedex_ids:
+            The pokedex ids of the pokemon whose icons are likely to be shown soon
+        """
+        with self._pending_ready:
+            self._pending.extendleft(reversed(list(pokedex_ids)))
+            self._pending_ready.notify()
+
+        if self._worker is None:
+            self._worker = Thread(target=self._warm_forever, name="icon-cache-warm", daemon=True)
+            self._worker.start()
+
+    def info(self) -> Dict[str, int]:
+        """Return the hit/miss statistics of this cache.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "icons": len(self._icons),
+                    "bytes": self._size, "max_bytes": self.max_bytes}
+
+    def _warm_forever(self) -> None:
+        """Load pending icons, waiting whenever there are none.
+        """
+        while True:
+            with self._pending_ready:
+                while len(self._pending) == 0:
+                    self._pending_ready.wait()
+                pokedex_id = self._pending.popleft()
+
+            with self._lock:
+                cached = pokedex_id in self._icons
+            if not cached:
+                self._load(pokedex_id)
+
+    def _load(self, pokedex_id: int) -> Optional[bytes]:
+        """Read and encode an icon from disk and cache it.
+        """
+        try:
+            with open(os.path.join(self.directory, str(pokedex_id) + ".png"), "rb") as file:
+                icon = base64.b64encode(file.read())
+        except OSError:
+            return None
+
+        with self._lock:
+            if pokedex_id not in self._icons and len(icon) <= self.max_bytes:
+                self._icons[pokedex_id] = icon
+                self._size += len(icon)
+
+                # Evict the least recently used icons until the cache fits again
+                while self._size > self.max_bytes:
+                    _, evicted = self._icons.popitem(last=False)
+                    self._size -= len(evicted)
+        return icon
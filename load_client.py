@@ -0,0 +1,115 @@
+"""
+Load Client Module
+===============================
+The functions defined in this class are responsible for load testing the
+query service in service.py. A number of client threads send find queries
+to the service as fast as they can, and the throughput and latency
+percentiles of the requests are reported at the end, in the same format as
+a headless batch.
+
+Start the service, then run "python load_client.py --url http://127.0.0.1:8000".
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from urllib.parse import quote
+from batch import summarize
+
+TYPES = ['flying', 'ice', 'psychic', 'ghost', 'water', 'ground', 'steel', 'rock', 'fighting',
+         'fire', 'electric', 'poison', 'grass', 'bug', 'dark', 'normal', 'fairy', 'dragon']
+
+STATS = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
+
+DEGREES = ["low", "medium", "high"]
+
+
+def default_queries() -> List[str]:
+    """
+    Returns every find query with one stat condition on a single type.
+
+    >>> len(default_queries())
+    324
+    """
+    return ["find " + " ".join(query) for query in itertools.product(TYPES, DEGREES, STATS)]
+
+
+def send_query(url: str, query: str) -> Tuple[float, bool]:
+    """
+    Sends one query to the service.
+
+    :param url:
+        The base url of the service
+    :param query:
+        A find or plot query
+    :return:
+        The latency of the request in seconds, and whether it succeeded
+    """
+    endpoint = url.rstrip("/") + "/" + query.split(" ")[0] + "?q=" + quote(query)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(endpoint) as response:
+            response.read()
+            ok = response.status == 200
+    except OSError:  # Includes HTTP errors, which urlopen raises for 4xx and 5xx statuses
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_load(url: str, queries: List[str], requests: int, concurrency: int) -> dict:
+    """
+    Sends requests queries (cycling through queries) from concurrency client
+    threads at once, and summarizes their latencies.
+
+    :param url:
+        The base url of the service
+    :param queries:
+        The queries to send
+    :param requests:
+        The total number of requests
+    :param concurrency:
+        The number of requests in flight at once
+    :return:
+        The summary of the requests, in the format of batch.summarize
+    """
+    workload = list(itertools.islice(itertools.cycle(queries), requests))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda query: send_query(url, query), workload))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in outcomes]
+    errors = sum(1 for _, ok in outcomes if not ok)
+    summary = summarize(latencies, errors, elapsed)
+    summary["concurrency"] = concurrency
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the pokemon recommender query service")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="the base url of the service")
+    parser.add_argument("--queries", metavar="FILE", default=None,
+                        help="a file of queries to send, one per line (every single-type find query by default)")
+    parser.add_argument("--requests", type=int, default=2000, help="the total number of requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="the number of requests in flight at once")
+    args = parser.parse_args()
+
+    if args.queries is None:
+        queries = default_queries()
+    else:
+        with open(args.queries) as file:
+            queries = [line.strip() for line in file if line.strip() != ""]
+
+    print(json.dumps(run_load(args.url, queries, args.requests, args.concurrency)), file=sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,16 +8,153 @@ Dataset Link: https://drive.google.com/file/d/1bCgAsWunc_wk0klc_tAEBkgvaT6DBAmu/
 ===============================
 This file is Copyright (c) 2021 Aditya Mehrotra.
 """
-from gui import Gui
-from process import read_data, create_decision_tree, generate_pokemon_to_stats_mapping
+import argparse
+import json
+import sys
+from typing import Any
+from startup_profile import StartupProfiler
+
+# The heavy modules (numpy, pandas, PySimpleGUI) are imported inside main, so
+# that --profile-startup can time them and --help does not pay for them
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line arguments of the program
+    """
+    parser = argparse.ArgumentParser(description="Pokemon recommender")
+    parser.add_argument("--data", default="data/pokemon.csv", help="the pokemon CSV file to load")
+    parser.add_argument("--materialize", choices=["off", "eager", "background"], default="off",
+                        help="precompute the answer to every find query, either before the window "
+                             "opens (eager) or on a background thread after it opens (background)")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="always parse the CSV and rebuild every tree, instead of loading "
+                             "(and saving) a binary snapshot of them")
+    parser.add_argument("--buckets", type=int, default=3,
+                        help="the number of degrees each stat is split into: 3 gives low/medium/high, "
+                             "5 gives very_low/low/medium/high/very_high and any other number gives q1..qN")
+    parser.add_argument("--per-type-thresholds", action="store_true",
+                        help="compute the degrees of each type from the pokemon of that type only")
+    parser.add_argument("--streaming-quantiles", action="store_true",
+                        help="estimate the degree thresholds in one streaming pass over the CSV "
+                             "(approximate, requires --no-snapshot and cannot be combined with "
+                             "--per-type-thresholds)")
+    parser.add_argument("--build-workers", type=int, default=None,
+                        help="build the per-type subtrees of the decision tree in this many processes")
+    parser.add_argument("--batch", metavar="FILE", default=None,
+                        help="instead of opening the GUI, evaluate the queries in FILE (one per line, "
+                             "- for standard input) and write one line of JSON per query to standard "
+                             "output, followed by a throughput summary on standard error")
+    parser.add_argument("--metrics", metavar="FILE", default=None,
+                        help="record stage timers, query latencies, BST traversal counts and tree shapes, "
+                             "and write them to FILE as JSON every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="the number of seconds between writes of the --metrics file")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report the wall time of every startup import and stage on standard error")
+    args = parser.parse_args()
+
+    if args.buckets < 2:
+        parser.error("--buckets must be at least 2")
+    if args.streaming_quantiles and (not args.no_snapshot or args.per_type_thresholds):
+        parser.error("--streaming-quantiles requires --no-snapshot and cannot be combined with "
+                     "--per-type-thresholds")
+    return args
 
 
 def main():
-    df = read_data()
-    decision_tree = create_decision_tree(df)
-    pokemon_to_stats_mapping = generate_pokemon_to_stats_mapping(df)
-    gui = Gui(df, decision_tree, pokemon_to_stats_mapping)
-    gui.start_gui()
+    args = parse_args()
+    profiler = StartupProfiler(enabled=args.profile_startup)
+
+    profiler.import_module("numpy")
+    profiler.import_module("pandas")
+    process = profiler.import_module("process")
+    query_cache = profiler.import_module("query_cache")
+    metrics = profiler.import_module("metrics")
+
+    if args.metrics is not None:
+        metrics.METRICS.enabled = True
+        metrics.METRICS.start_dump_thread(args.metrics, args.metrics_interval)
+
+    if args.no_snapshot:
+        with profiler.stage("read"):
+            df = process.read_data(args.data)
+        with profiler.stage("quantiles"):
+            if args.streaming_quantiles:
+                conversion_dictionary = process.find_quantiles_streaming(process.iter_data(args.data),
+                                                                         args.buckets)
+            else:
+                conversion_dictionary = process.find_quantiles(df, args.buckets)
+        with profiler.stage("tree build"):
+            decision_tree = process.create_decision_tree(df, conversion_dictionary=conversion_dictionary,
+                                                         workers=args.build_workers, buckets=args.buckets,
+                                                         per_type_thresholds=args.per_type_thresholds)
+        with profiler.stage("stats mapping"):
+            pokemon_to_stats_mapping = process.generate_pokemon_to_stats_mapping(df)
+    else:
+        snapshot = profiler.import_module("snapshot")
+        with profiler.stage("snapshot load"):
+            df, decision_tree, pokemon_to_stats_mapping = snapshot.load_or_build(
+                args.data, workers=args.build_workers, buckets=args.buckets,
+                per_type_thresholds=args.per_type_thresholds)
+    decision_tree.set_cache(query_cache.QueryCache(maxsize=256))
+    if metrics.METRICS.enabled:
+        metrics.METRICS.record_tree_shape(decision_tree)
+
+    # Every other query structure uses the same thresholds as the decision tree. They
+    # are only shared by every type if the tree was not built with per-type thresholds
+    type_conversion_dictionaries = decision_tree.type_conversion_dictionaries()
+    shared_thresholds = None if args.per_type_thresholds else next(iter(type_conversion_dictionaries.values()))
+
+    # The answer table only holds answers for thresholds shared by every type
+    if args.materialize != "off" and shared_thresholds is not None:
+        with profiler.stage("answer table"):
+            answer_table = process.create_answer_table(df, shared_thresholds)
+            decision_tree.set_answer_table(answer_table)
+            if args.materialize == "eager":
+                answer_table.build()
+            else:
+                answer_table.build_in_background()
+
+    with profiler.stage("bitmap index"):
+        bitmap_index = process.create_tree_bitmap_index(df, decision_tree)
+
+    try:
+        if args.batch is not None:
+            batch = profiler.import_module("batch")
+            profiler.report()
+            run_batch_file(batch, args.batch, df, decision_tree, bitmap_index)
+            return
+
+        with profiler.stage("histogram cache"):
+            histogram_cache = process.create_histogram_cache(df)
+
+        # The name index is built by the GUI when the user first types a name
+        gui = profiler.import_module("gui")
+        recommender = gui.Gui(df, decision_tree, pokemon_to_stats_mapping, bitmap_index=bitmap_index,
+                              histogram_cache=histogram_cache)
+
+        def on_window_ready() -> None:
+            profiler.stop_stage("window creation")
+            profiler.report()
+
+        profiler.start_stage("window creation")
+        recommender.start_gui(on_window_ready=on_window_ready)
+    finally:
+        metrics.METRICS.stop_dump_thread()  # Writes the metrics one last time
+
+
+def run_batch_file(batch: Any, path: str, df: Any, decision_tree: Any, bitmap_index: Any) -> None:
+    """
+    Runs the queries in a file (or standard input, if path is "-") without
+    the GUI, and reports the throughput of the batch on standard error.
+    """
+    if path == "-":
+        summary = batch.run_batch(sys.stdin, df, decision_tree, bitmap_index)
+    else:
+        with open(path) as file:
+            summary = batch.run_batch(file, df, decision_tree, bitmap_index)
+    print(json.dumps(summary), file=sys.stderr)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,302 @@
+"""
+Metrics Module
+===============================
+The functions/classes defined in this class are responsible for recording
+where time goes while the program runs: how long each stage of the data
+pipeline takes, how long queries take, how much of a BST a query visits,
+and the shape of every tree the queries run on.
+
+Instrumentation is opt-in. Every instrumented hot path checks METRICS.enabled
+(one attribute lookup) before doing any work, so a disabled registry costs
+next to nothing. Metrics are read in-process with METRICS.snapshot(), or
+written to a JSON file periodically with METRICS.start_dump_thread.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+import bisect
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+# Histogram bucket upper bounds for durations in seconds, from 1 microsecond to 10 seconds
+LATENCY_BOUNDS = [10 ** (exponent / 4) for exponent in range(-24, 5)]
+
+# Histogram bucket upper bounds for counts (such as the number of BST nodes visited)
+COUNT_BOUNDS = [2 ** exponent for exponent in range(0, 31)]
+
+
+class Histogram:
+    """
+    A class that represents a histogram with fixed bucket bounds
+
+    Instance Attributes:
+        - bounds: The upper bound of every bucket, in ascending order. Values
+        above the last bound are counted in one more overflow bucket.
+        - counts: The number of values in every bucket
+        - count: The number of values observed
+        - total: The sum of the values observed
+        - maximum: The largest value observed, None if no value was observed
+
+    Representation Invariants:
+        - len(self.counts) == len(self.bounds) + 1
+        - sum(self.counts) == self.count
+    """
+    bounds: Sequence[float]
+    counts: List[int]
+    count: int
+    total: float
+    maximum: Optional[float]
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = None
+
+    def observe(self, value: float) -> None:
+        """Add a value to this histogram.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Return an upper bound of the given percentile: the upper bound of the
+        bucket it falls in (or the maximum, for the overflow bucket).
+
+        >>> histogram = Histogram([1, 2, 4])
+        >>> for value in [1, 1, 2, 3]:
+        ...     histogram.observe(value)
+        >>> histogram.percentile(50), histogram.percentile(100)
+        (1, 4)
+        """
+        if self.count == 0:
+            return None
+
+        rank = percent / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count > 0:
+                return self.bounds[i] if i < len(self.bounds) else self.maximum
+        return self.maximum
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the count, mean, maximum and approximate percentiles of this histogram.
+        """
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count > 0 else None,
+                "max": self.maximum,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99)}
+
+
+class Metrics:
+    """
+    A class that represents a registry of metrics
+
+    Instance Attributes:
+        - enabled: Whether anything is recorded
+        - stages: The histogram of the duration of every pipeline stage, in seconds
+        - histograms: Every other histogram, by name
+        - counters: Every counter, by name
+        - tree_shapes: The shape of every range index of the last decision tree
+        recorded with record_tree_shape, by "type/stat"
+
+    Private Instance Attributes:
+        - _lock: A lock guarding every metric, since queries run on several threads
+        - _dump_stop: Set to stop the dump thread, None if no dump thread was started
+        - _dump_thread: The thread dumping metrics, None if no dump thread was started
+    """
+    enabled: bool
+    stages: Dict[str, Histogram]
+    histograms: Dict[str, Histogram]
+    counters: Dict[str, int]
+    tree_shapes: Dict[str, Dict[str, int]]
+    _lock: Lock
+    _dump_stop: Optional[Event]
+    _dump_thread: Optional[Thread]
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.stages = {}
+        self.histograms = {}
+        self.counters = {}
+        self.tree_shapes = {}
+        self._lock = Lock()
+        self._dump_stop = None
+        self._dump_thread = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        A context manager which records the duration of a pipeline stage.
+
+        :param name:
+            The name of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - start)
+
+    def timed(self, name: str) -> Callable[[Callable], Callable]:
+        """
+        A decorator which records the duration of every call of a function
+        as the pipeline stage name.
+
+        :param name:
+            The name of the stage
+        """
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe_stage(self, name: str, seconds: float) -> None:
+        """Record the duration of a pipeline stage that was timed elsewhere.
+        """
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = Histogram(LATENCY_BOUNDS)
+            self.stages[name].observe(seconds)
+
+    def observe(self, name: str, value: float, bounds: Sequence[float] = LATENCY_BOUNDS) -> None:
+        """
+        Add a value to a histogram, creating the histogram the first time.
+
+        :param name:
+            The name of the histogram
+        :param value:
+            The value to add, a duration in seconds unless other bounds are given
+        :param bounds:
+            The bucket bounds used if the histogram has to be created
+        """
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(bounds)
+            self.histograms[name].observe(value)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Add amount to a counter.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_traversal(self, nodes_visited: int, depth: int) -> None:
+        """Record how many nodes a BST range query visited, and the depth of the deepest one.
+        """
+        with self._lock:
+            for name, value in [("bst nodes visited", nodes_visited), ("bst depth", depth)]:
+                if name not in self.histograms:
+                    self.histograms[name] = Histogram(COUNT_BOUNDS)
+                self.histograms[name].observe(value)
+            self.counters["bst range queries"] = self.counters.get("bst range queries", 0) + 1
+
+    def record_search(self, probes: int, range_size: int) -> None:
+        """Record how many values a sorted array range query probed with its two
+        binary searches, and how many pokemon were in the range it found.
+        """
+        with self._lock:
+            for name, value in [("sorted array probes", probes), ("sorted array range size", range_size)]:
+                if name not in self.histograms:
+                    self.histograms[name] = Histogram(COUNT_BOUNDS)
+                self.histograms[name].observe(value)
+            self.counters["sorted array range queries"] = self.counters.get("sorted array range queries", 0) + 1
+
+    def record_tree_shape(self, decision_tree: Any) -> None:
+        """
+        Record the shape of every range index of a decision tree, see DecisionTree.index_shapes.
+        Tree shapes are recorded even when this registry is disabled, since
+        they are only computed when asked for.
+        """
+        shapes = decision_tree.index_shapes()
+        with self._lock:
+            self.tree_shapes = shapes
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return every metric as a JSON-serializable dictionary.
+        """
+        with self._lock:
+            return {"time": time.time(),
+                    "stages": {name: histogram.summary() for name, histogram in self.stages.items()},
+                    "histograms": {name: histogram.summary() for name, histogram in self.histograms.items()},
+                    "counters": dict(self.counters),
+                    "tree_shapes": dict(self.tree_shapes)}
+
+    def reset(self) -> None:
+        """Forget every metric recorded so far.
+        """
+        with self._lock:
+            self.stages = {}
+            self.histograms = {}
+            self.counters = {}
+            self.tree_shapes = {}
+
+    def dump(self, path: str) -> None:
+        """
+        Write a snapshot of every metric to a JSON file. The file is replaced
+        atomically, so a reader never sees a half-written dump.
+
+        :param path:
+            The path of the JSON file
+        """
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.snapshot(), file, indent=2)
+        os.replace(temp_path, path)
+
+    def start_dump_thread(self, path: str, interval: float = 10.0) -> None:
+        """
+        Dump every metric to a JSON file every interval seconds, on a daemon thread,
+        until stop_dump_thread is called.
+
+        :param path:
+            The path of the JSON file
+        :param interval:
+            The number of seconds between dumps
+        """
+        self.stop_dump_thread()
+        stop = Event()
+
+        def dump_forever() -> None:
+            while not stop.wait(interval):
+                self.dump(path)
+            self.dump(path)  # A final dump, so the file is up to date when the program exits
+
+        self._dump_stop = stop
+        self._dump_thread = Thread(target=dump_forever, name="metrics-dump", daemon=True)
+        self._dump_thread.start()
+
+    def stop_dump_thread(self) -> None:
+        """Stop the dump thread started by start_dump_thread, after one last dump.
+        """
+        if self._dump_stop is not None:
+            self._dump_stop.set()
+            self._dump_thread.join()
+            self._dump_stop = None
+            self._dump_thread = None
+
+
+# The registry every module records into, disabled until the program enables it
+METRICS = Metrics()
@@ -0,0 +1,200 @@
+"""
+Name Index Module
+===============================
+The functions/classes defined in this class are responsible for looking up
+pokemon by name, both by prefix and with typos, fast enough to suggest names
+while the user is typing.
+
+Prefix lookups are binary searches over the lowercased names in sorted order.
+Typo-tolerant lookups use a trigram index: every name is stored under each of
+its trigrams (substrings of three characters, padded at both ends), which takes
+space linear in the total length of the names. One edit changes at most three
+trigrams, so a name within an edit distance k of the text shares all but 3 * k
+of the text's trigrams. Only the few names that share enough trigrams have
+their edit distance computed.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class NameIndex:
+    """
+    A class that represents a prefix and typo-tolerant index of pokemon names
+
+    Instance Attributes:
+        - keys: The lowercased form of every distinct name, in sorted order
+        - names: A mapping from every key to the names with that lowercased form
+        - max_distance: The largest edit distance a fuzzy lookup can tolerate
+
+    Private Instance Attributes:
+        - _trigrams: A mapping from every trigram of a key to the positions in
+        keys of the keys that contain it, in ascending order
+
+    Representation Invariants:
+        - all(self.keys[i] < self.keys[i + 1] for i in range(len(self.keys) - 1))
+        - set(self.keys) == set(self.names)
+        - self.max_distance >= 0
+    """
+    keys: List[str]
+    names: Dict[str, List[str]]
+    max_distance: int
+    _trigrams: Dict[str, List[int]]
+
+    def __init__(self, names: Iterable[str], max_distance: int = 2) -> None:
+        """
+        Index the given names.
+
+        >>> index = NameIndex(["Pikachu", "Raichu", "Pichu", "Charmander"])
+        >>> index.prefix("pi")
+        ['Pichu', 'Pikachu']
+        >>> index.fuzzy("pikachoo")
+        ['Pikachu']
+        >>> index.suggest("richu")
+        ['Pichu', 'Raichu']
+
+        :param names:
+            The pokemon names, duplicates are indexed once
+        :param max_distance:
+            The largest edit distance a fuzzy lookup can tolerate
+        """
+        self.names = {}
+        for name in names:
+            name = str(name)
+            same_key = self.names.setdefault(name.lower(), [])
+            if name not in same_key:
+                same_key.append(name)
+
+        self.keys = sorted(self.names)
+        self.max_distance = max_distance
+        self._trigrams = {}
+        for position, key in enumerate(self.keys):
+            for trigram in _trigrams(key):
+                self._trigrams.setdefault(trigram, []).append(position)
+
+    def prefix(self, text: str, limit: int = 10) -> List[str]:
+        """
+        Return the names that start with text (ignoring case), in alphabetical order.
+
+        :param text:
+            The start of a name
+        :param limit:
+            The maximum number of names to return
+        :return:
+            At most limit names that start with text
+        """
+        text = text.strip().lower()
+        results = []
+        position = bisect_left(self.keys, text)
+        while position < len(self.keys) and self.keys[position].startswith(text) and len(results) < limit:
+            results.extend(self.names[self.keys[position]])
+            position += 1
+        return results[:limit]
+
+    def fuzzy(self, text: str, max_distance: Optional[int] = None, limit: int = 10) -> List[str]:
+        """
+        Return the names within an edit distance of text (ignoring case), closest first.
+
+        :param text:
+            A possibly misspelled name
+        :param max_distance:
+            The largest edit distance to tolerate, at most self.max_distance
+            (which is the default)
+        :param limit:
+            The maximum number of names to return
+        :return:
+            At most limit names, in ascending order of edit distance and then alphabetically
+        """
+        text = text.strip().lower()
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+
+        # A key within max_distance of text shares at least this many of its trigrams
+        trigrams = _trigrams(text)
+        min_shared = len(trigrams) - 3 * max_distance
+        if min_shared > 0:
+            shared = {}
+            for trigram in trigrams:
+                for position in self._trigrams.get(trigram, ()):
+                    shared[position] = shared.get(position, 0) + 1
+            candidates = [self.keys[position] for position, count in shared.items() if count >= min_shared]
+        else:
+            # Text this short is within max_distance of any key of a similar length
+            candidates = [key for key in self.keys if abs(len(key) - len(text)) <= max_distance]
+
+        matches = []
+        for key in candidates:
+            distance = edit_distance(text, key, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, key))
+        matches.sort()
+
+        results = []
+        for _, key in matches:
+            results.extend(self.names[key])
+        return results[:limit]
+
+    def suggest(self, text: str, limit: int = 10) -> List[str]:
+        """
+        Return the names to suggest for text the user has typed so far: the
+        names that start with it, followed by the names it is a close misspelling of.
+        Short text tolerates fewer typos, so that it is not close to every name.
+
+        :param text:
+            The text typed so far
+        :param limit:
+            The maximum number of names to return
+        :return:
+            At most limit distinct names
+        """
+        text = text.strip()
+        if text == "":
+            return []
+
+        suggestions = self.prefix(text, limit)
+        if len(suggestions) < limit:
+            max_distance = 1 if len(text) <= 4 else 2
+            for name in self.fuzzy(text, max_distance, limit):
+                if name not in suggestions:
+                    suggestions.append(name)
+        return suggestions[:limit]
+
+
+def _trigrams(word: str) -> Set[str]:
+    """
+    Return the distinct trigrams of word, padded with two spaces at both ends
+    so that even a word of one character has trigrams.
+
+    >>> sorted(_trigrams("abc"))
+    ['  a', ' ab', 'abc', 'bc ', 'c  ']
+    """
+    padded = "  " + word + "  "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(first: str, second: str, bound: int) -> int:
+    """
+    Return the edit (Levenshtein) distance between two strings, or bound + 1 if
+    it is larger than bound. Rows of the table stop being computed as soon as
+    every entry exceeds bound.
+
+    >>> edit_distance("kitten", "sitting", 5)
+    3
+    >>> edit_distance("kitten", "sitting", 2)
+    3
+    """
+    if abs(len(first) - len(second)) > bound:
+        return bound + 1
+
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (first_char != second_char)))
+        if min(current) > bound:
+            return bound + 1
+        previous = current
+    return min(previous[-1], bound + 1)
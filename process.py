@@ -8,118 +8,559 @@ from the dataset and generating trees and dictionaries.
 This file is Copyright (c) 2020 Aditya Mehrotra.
 """
 
-from typing import Any, Optional, Tuple, Dict
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, Dict, List, Iterator, Iterable
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
 from bst import BinarySearchTree
 from decision_tree import DecisionTree
+from sorted_index import SortedArrayIndex
+from bitmap_index import BitmapIndex
+from batch_query import BatchQueryEngine
+from answer_table import AnswerTable
+from histogram_cache import HistogramCache
+from name_index import NameIndex
+from stats_store import StatsStore, FIELDS
+from streaming_quantiles import TDigest
+from metrics import METRICS
 
 
-def read_data() -> pd.DataFrame:
+# The dataset read by default
+DATA_PATH = "data/pokemon.csv"
+
+# The only columns of the dataset the program uses
+USED_COLUMNS = ["name", "pokedex_number", "type1", "type2",
+                "attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
+
+# Compact dtypes for the used columns, no stat is larger than 255
+COMPACT_DTYPES = {"pokedex_number": "int32", "type1": "category", "type2": "category",
+                  "attack": "int16", "defense": "int16", "speed": "int16",
+                  "sp_defense": "int16", "sp_attack": "int16", "hp": "int16"}
+
+
+@METRICS.timed("load")
+def read_data(path: str = DATA_PATH, columns: Optional[List[str]] = None, compact: bool = True,
+              chunksize: Optional[int] = None) -> pd.DataFrame:
     """
     This function reads in my CSV and returns a pandas
     dataframe
 
+    :param path:
+        The path of the CSV file
+    :param columns:
+        The columns to load, by default only the columns the program uses (USED_COLUMNS)
+    :param compact:
+        Whether to load the used columns with compact dtypes (int16 stats and
+        categorical types) instead of pandas' default int64 and object dtypes
+    :param chunksize:
+        If given, the CSV is parsed this many rows at a time (see iter_data) and
+        the chunks are concatenated. Every chunk is held until the concatenation,
+        so the peak memory is still about twice the final dataframe; to stay
+        within one chunk, consume iter_data directly (as find_quantiles_streaming does)
     :return:
         Pandas dataframe
     """
-    df = pd.read_csv("data/pokemon.csv")
+    if chunksize is None:
+        return pd.read_csv(path, usecols=_projection(columns), dtype=_dtypes(columns, compact))
+
+    chunks = list(iter_data(path, columns, compact, chunksize))
+    if len(chunks) == 0:
+        return pd.read_csv(path, usecols=_projection(columns), dtype=_dtypes(columns, compact), nrows=0)
+
+    df = pd.concat(chunks, ignore_index=True)
+
+    # Chunks can have different categories, which pd.concat turns back into objects
+    for column, dtype in _dtypes(columns, compact).items():
+        if dtype == "category" and column in df:
+            df[column] = union_categoricals([chunk[column] for chunk in chunks])
     return df
 
 
-def find_quantiles(df: pd.DataFrame) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+def iter_data(path: str = DATA_PATH, columns: Optional[List[str]] = None, compact: bool = True,
+              chunksize: int = 100000) -> Iterator[pd.DataFrame]:
+    """
+    This function streams my CSV as a sequence of pandas dataframes of at most
+    chunksize rows, so that datasets which do not fit in memory can still be
+    processed one chunk at a time.
+
+    :param path:
+        The path of the CSV file
+    :param columns:
+        The columns to load, by default only the columns the program uses (USED_COLUMNS)
+    :param compact:
+        Whether to load the used columns with compact dtypes
+    :param chunksize:
+        The maximum number of rows in each chunk
+    :return:
+        An iterator over the chunks of the dataset, in file order
+    """
+    with pd.read_csv(path, usecols=_projection(columns), dtype=_dtypes(columns, compact),
+                     chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _projection(columns: Optional[List[str]]) -> List[str]:
+    """
+    Return the columns to load from the CSV.
+    """
+    return USED_COLUMNS if columns is None else columns
+
+
+def _dtypes(columns: Optional[List[str]], compact: bool) -> Dict[str, str]:
+    """
+    Return the compact dtypes of the columns to load, or no dtypes if compact is False.
+    """
+    if not compact:
+        return {}
+    return {column: dtype for column, dtype in COMPACT_DTYPES.items() if column in _projection(columns)}
+
+
+def degree_names(buckets: int) -> List[str]:
+    """
+    Returns the names of the degrees of a query, from the lowest bucket of
+    stat values to the highest.
+
+    Preconditions:
+        - buckets >= 2
+
+    >>> degree_names(3)
+    ['low', 'medium', 'high']
+    >>> degree_names(5)
+    ['very_low', 'low', 'medium', 'high', 'very_high']
+    >>> degree_names(4)
+    ['q1', 'q2', 'q3', 'q4']
+
+    :param buckets:
+        The number of buckets stat values are split into
+    :return:
+        The name of every bucket
+    """
+    if buckets == 3:
+        return ["low", "medium", "high"]
+    elif buckets == 5:
+        return ["very_low", "low", "medium", "high", "very_high"]
+    else:
+        return ["q" + str(i + 1) for i in range(buckets)]
+
+
+def bucket_probabilities(buckets: int) -> List[float]:
+    """
+    Returns the quantiles that separate the buckets. Three buckets keep the
+    25th and 75th percentiles described in the project report, any other
+    number of buckets holds an equal share of the pokemon each.
+
+    >>> bucket_probabilities(3)
+    [0.25, 0.75]
+    >>> bucket_probabilities(5)
+    [0.2, 0.4, 0.6, 0.8]
+    """
+    if buckets == 3:
+        return [0.25, 0.75]
+    return [i / buckets for i in range(1, buckets)]
+
+
+def _thresholds_from_cuts(cuts: np.ndarray, stats: List[str]) \
+        -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+    """
+    Converts the cut points between buckets (cuts[i, j] is the upper end of
+    bucket i of stats[j]) into a degree to constraints mapping.
+    """
+    degrees = degree_names(len(cuts) + 1)
+    stat_to_quantiles = {}
+
+    for j, stat in enumerate(stats):
+        for i, degree in enumerate(degrees):
+            lower = None if i == 0 else cuts[i - 1, j]
+            upper = None if i == len(cuts) else cuts[i, j]
+            stat_to_quantiles[degree + " " + stat] = (lower, upper)
+
+    return stat_to_quantiles
+
+
+@METRICS.timed("quantiles")
+def find_quantiles(df: pd.DataFrame, buckets: int = 3) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
     """
     This function generates a dictionary which maps
     degrees into tuples in the form (Lower bound, Upper bound)
     where Upper bound or lower bound is None if there is no upper bound or lower bound
 
+    Every quantile of every stat is computed in a single np.quantile call.
+
     Please see the project report for more information
     :param df:
         a pandas dataframe
+    :param buckets:
+        The number of buckets (degrees) each stat is split into, see degree_names
     :return:
         A degree to constraints mapping
     """
-    stat_to_quantiles = {}
     stats = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
 
-    for stat in stats:
-        stat_column = df.loc[:, stat].to_numpy()
+    cuts = np.quantile(df.loc[:, stats].to_numpy(), bucket_probabilities(buckets), axis=0)
+    return _thresholds_from_cuts(cuts, stats)
 
-        stat_to_quantiles["low " + stat] = (None, np.percentile(stat_column, 25))
-        stat_to_quantiles["medium " + stat] = (np.percentile(stat_column, 25), np.percentile(stat_column, 75))
-        stat_to_quantiles["high " + stat] = (np.percentile(stat_column, 75), None)
 
-    return stat_to_quantiles
+def find_type_quantiles(df: pd.DataFrame, buckets: int = 3) \
+        -> Dict[str, Dict[str, Tuple[Optional[float], Optional[float]]]]:
+    """
+    This function generates a degree to constraints mapping for every pokemon
+    type, where the buckets of a type are computed from the pokemon of that
+    type only. For example, "high attack" for dragon pokemon means high
+    compared to other dragon pokemon.
+
+    :param df:
+        a pandas dataframe
+    :param buckets:
+        The number of buckets (degrees) each stat is split into
+    :return:
+        A mapping from every type (see group_rows_by_type) to its degree to constraints mapping
+    """
+    stats = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
+    stat_values = df.loc[:, stats].to_numpy()
+    probabilities = bucket_probabilities(buckets)
+
+    return {pokemon_type: _thresholds_from_cuts(np.quantile(stat_values[rows], probabilities, axis=0), stats)
+            for pokemon_type, rows in group_rows_by_type(df).items()}
+
+
+def find_quantiles_streaming(chunks: Iterable[pd.DataFrame], buckets: int = 3, compression: float = 200) \
+        -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+    """
+    An approximate version of find_quantiles over a dataset given in chunks
+    (for example by iter_data), which never holds more than one chunk in memory.
+    Each stat is summarized with a t-digest, so the thresholds can differ
+    slightly from the exact ones.
+
+    :param chunks:
+        The chunks of a dataset
+    :param buckets:
+        The number of buckets (degrees) each stat is split into
+    :param compression:
+        The compression of the t-digests, larger is more accurate
+    :return:
+        A degree to constraints mapping
+    """
+    stats = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
+    digests = [TDigest(compression) for _ in stats]
+
+    for chunk in chunks:
+        for stat, digest in zip(stats, digests):
+            digest.update(chunk.loc[:, stat].to_numpy())
+
+    cuts = np.stack([digest.quantile(bucket_probabilities(buckets)) for digest in digests], axis=1)
+    return _thresholds_from_cuts(cuts, stats)
 
 
-def generate_pokemon_to_stats_mapping(df: pd.DataFrame) -> Dict[Any, Dict[str, Any]]:
+def dataset_version(df: pd.DataFrame,
+                    conversion_dictionary: Dict[str, Tuple[Optional[float], Optional[float]]]) -> str:
     """
-    Generates a dictionary which maps a pokemon's name
-    to a dictionary which maps stat names to their values.
+    Generates a fingerprint of the dataset and the degree thresholds computed
+    from it. Any change to either one produces a different fingerprint, which
+    is used to invalidate cached query results.
+
+    Only the columns the program uses are fingerprinted, and their values are
+    normalized first, so the fingerprint does not depend on how they were loaded.
 
     :param df:
         A pandas dataframe
+    :param conversion_dictionary:
+        A degree to constraints mapping, as produced by find_quantiles
     :return:
-        A pokemon name to stats mapping
+        A hex digest identifying the dataset and thresholds
     """
-    names = df.loc[:, "name"]
-    attack = df.loc[:, "attack"]
-    defense = df.loc[:, "defense"]
-    sp_attack = df.loc[:, "sp_attack"]
-    sp_defense = df.loc[:, "sp_defense"]
-    speed = df.loc[:, "speed"]
-    hp = df.loc[:, "hp"]
-    pokedex_id = df.loc[:, "pokedex_number"]
+    digest = hashlib.sha1()
 
-    pokemon_to_stats = {}
+    for column in ["name", "type1", "type2"]:
+        values = df.loc[:, column].astype(object).fillna("").to_numpy()
+        digest.update(pd.util.hash_array(values).tobytes())
 
-    for i, name in enumerate(names):
-        pokemon_to_stats[name] = {
-            "attack": attack[i],
-            "defense": defense[i],
-            "sp_attack": sp_attack[i],
-            "sp_defense": sp_defense[i],
-            "speed": speed[i],
-            "hp": hp[i],
-            "pokedex_id": pokedex_id[i]
-        }
-    return pokemon_to_stats
+    for column in ["pokedex_number", "attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]:
+        digest.update(df.loc[:, column].to_numpy().astype(np.int64).tobytes())
 
+    thresholds = sorted((key, tuple(None if bound is None else float(bound) for bound in threshold))
+                        for key, threshold in conversion_dictionary.items())
+    digest.update(repr(thresholds).encode())
+    return digest.hexdigest()
 
-def create_decision_tree(df: pd.DataFrame) -> DecisionTree:
+
+def generate_pokemon_to_stats_mapping(df: pd.DataFrame) -> StatsStore:
+    """
+    Generates a mapping from a pokemon's name to a mapping
+    from stat names to their values.
+
+    The stats are stored column by column (see StatsStore), so
+    no per-pokemon dictionaries are built.
+
+    :param df:
+        A pandas dataframe
+    :return:
+        A pokemon name to stats mapping
+    """
+    columns = {stat: df.loc[:, stat].to_numpy() for stat in FIELDS if stat != "pokedex_id"}
+    columns["pokedex_id"] = df.loc[:, "pokedex_number"].to_numpy()
+
+    return StatsStore(df.loc[:, "name"].to_numpy().tolist(), columns)
+
+
+@METRICS.timed("build")
+def create_decision_tree(df: pd.DataFrame, backend: str = "bst",
+                         conversion_dictionary: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                         workers: Optional[int] = None, buckets: int = 3,
+                         per_type_thresholds: bool = False) -> DecisionTree:
     """
     Generates a decision tree using the pandas dataframe.
     The format, size, structure and purpose of this
     decision tree is all explicitly defined in the report with
     examples.
 
+    Preconditions:
+        - backend in {"bst", "sorted_array"}
+        - workers is None or workers >= 1
+
     :param df:
         Pandas dataframe
+    :param backend:
+        The range index used for each (type, stat) pair, either a
+        pointer-based BST ("bst") or a columnar sorted-array index ("sorted_array")
+    :param conversion_dictionary:
+        The degree to constraints mapping of df, if it was already computed with find_quantiles
+    :param workers:
+        The number of processes used to build the per-type subtrees, the
+        subtrees are built in this process if it is None or 1
+    :param buckets:
+        The number of degrees each stat is split into, if conversion_dictionary is not given
+    :param per_type_thresholds:
+        Whether the degrees of each type are computed from the pokemon of that
+        type only (see find_type_quantiles), instead of from every pokemon
     :return:
         A decision Tree
     """
-
     # Create the base tree
     base_tree = DecisionTree(category=None, is_binary_parent=False, conversion_dictionary=None)
     stats = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
 
-    # Get all pokemon types
+    # Generate conversion dictionary, one per type with per-type thresholds
+    type_rows = group_rows_by_type(df)
+    if per_type_thresholds:
+        type_conversion_dictionaries = find_type_quantiles(df, buckets)
+        base_tree.version = dataset_version(df, {pokemon_type + " " + key: threshold
+                                                 for pokemon_type, thresholds in type_conversion_dictionaries.items()
+                                                 for key, threshold in thresholds.items()})
+    else:
+        if conversion_dictionary is None:
+            conversion_dictionary = find_quantiles(df, buckets)
+        type_conversion_dictionaries = {pokemon_type: conversion_dictionary for pokemon_type in type_rows}
+        base_tree.version = dataset_version(df, conversion_dictionary)
+
+    # Assign every row to its type(s) in a single pass
+    names = df.loc[:, "name"].to_numpy()
+    stat_columns = {stat: df.loc[:, stat].to_numpy() for stat in stats}
+    tasks = [(pokemon_type, names[rows], rows, {stat: column[rows] for stat, column in stat_columns.items()},
+              backend, type_conversion_dictionaries[pokemon_type])
+             for pokemon_type, rows in type_rows.items()]
+
+    if workers is None or workers <= 1:
+        type_trees = [_create_type_tree(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            type_trees = list(executor.map(_create_type_tree, tasks))
+
+    for type_tree in type_trees:
+        # Sorted-array indexes aggregate other stats by their rows in the shared stat columns
+        if backend == "sorted_array":
+            for stat_tree in type_tree.subtrees:
+                stat_tree.subtrees[0].stat_columns = stat_columns
+        base_tree.add_subtree(type_tree)
+    return base_tree
+
+
+def group_rows_by_type(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    This function groups the rows of a pandas dataframe by pokemon type
+    in one pass over the type1 and type2 columns, instead of scanning
+    the dataframe once per type.
+
+    >>> df = pd.DataFrame({"type1": ["fire", "water", "fire"], "type2": [None, "fire", "flying"]})
+    >>> groups = group_rows_by_type(df)
+    >>> list(groups)
+    ['fire', 'water']
+    >>> groups["fire"].tolist()
+    [0, 1, 2]
+
+    :param df:
+        A pandas dataframe
+    :return:
+        A mapping from every type in column type1 (in sorted order) to the
+        positions of the rows with that type in column type1 or type2, in
+        ascending order
+    """
     types = np.unique(df.loc[:, "type1"].to_numpy())
 
-    # Generate conversion dictionary
-    conversion_dictionary = find_quantiles(df)
+    # The position of every row's types in types, -1 for a missing (or unknown) second type
+    type_index = pd.Index(types)
+    type1_codes = type_index.get_indexer(df.loc[:, "type1"].to_numpy())
+    type2_codes = type_index.get_indexer(df.loc[:, "type2"].to_numpy())
 
-    for pokemon_type in types:
-        type_tree = DecisionTree(category=pokemon_type, is_binary_parent=False, conversion_dictionary=None)
-        masked_df = mask_df(df, pokemon_type)
+    # Every row appears once for its first type, and once more for a (different) second type
+    positions = np.arange(len(df))
+    has_second_type = (type2_codes >= 0) & (type2_codes != type1_codes)
+    rows = np.concatenate((positions, positions[has_second_type]))
+    codes = np.concatenate((type1_codes, type2_codes[has_second_type]))
 
-        for stat in stats:
-            stat_tree = DecisionTree(category=stat, is_binary_parent=True,
-                                     conversion_dictionary=conversion_dictionary)
-            stat_tree.add_subtree(create_bst(masked_df.loc[:, "name"], masked_df.loc[:, stat]))
-            type_tree.add_subtree(stat_tree)
-        base_tree.add_subtree(type_tree)
-    return base_tree
+    order = np.lexsort((rows, codes))
+    rows = rows[order]
+    boundaries = np.searchsorted(codes[order], np.arange(len(types) + 1))
+
+    return {pokemon_type: rows[boundaries[i]:boundaries[i + 1]] for i, pokemon_type in enumerate(types)}
+
+
+def _create_type_tree(task: Tuple[str, np.ndarray, np.ndarray, Dict[str, np.ndarray], str,
+                                  Dict[str, Tuple[Optional[float], Optional[float]]]]) -> DecisionTree:
+    """
+    Creates the decision tree of a single pokemon type, and its six stat subtrees.
+    The task is a (type, names, rows, stat columns, backend, conversion dictionary) tuple,
+    packed into one argument so that it can be sent to a worker process.
+
+    For aggregates of another stat, a sorted-array index keeps the rows of its
+    pokemon in the dataset (the stat columns are shared by create_decision_tree),
+    while a BST stores the other stats in its nodes.
+    """
+    pokemon_type, names, rows, stat_columns, backend, conversion_dictionary = task
+
+    type_tree = DecisionTree(category=pokemon_type, is_binary_parent=False, conversion_dictionary=None)
+    for stat, stat_list in stat_columns.items():
+        stat_tree = DecisionTree(category=stat, is_binary_parent=True,
+                                 conversion_dictionary=conversion_dictionary)
+        if backend == "sorted_array":
+            stat_tree.add_subtree(create_sorted_index(names, stat_list, rows=rows))
+        else:
+            other_columns = {other: column for other, column in stat_columns.items() if other != stat}
+            stat_tree.add_subtree(create_bst(names, stat_list, other_columns))
+        type_tree.add_subtree(stat_tree)
+    return type_tree
+
+
+def create_bitmap_index(df: pd.DataFrame,
+                        conversion_dictionary: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                        type_conversion_dictionaries: Optional[Dict[str, Dict[str, Tuple[Optional[float],
+                                                                                         Optional[float]]]]] = None) \
+        -> BitmapIndex:
+    """
+    Generates a bitmap index using the pandas dataframe, which
+    is used to evaluate queries with more than one stat condition.
+    Pass the thresholds of the decision tree, so both structures agree on
+    what every degree means.
+
+    :param df:
+        Pandas dataframe
+    :param conversion_dictionary:
+        The degree to constraints mapping to index, find_quantiles(df) by default
+    :param type_conversion_dictionaries:
+        The degree to constraints mapping of every type, for a decision tree
+        built with per-type thresholds (see DecisionTree.type_conversion_dictionaries)
+    :return:
+        A bitmap index
+    """
+    if conversion_dictionary is None:
+        conversion_dictionary = find_quantiles(df)
+    return BitmapIndex(df, conversion_dictionary, type_conversion_dictionaries)
+
+
+def create_tree_bitmap_index(df: pd.DataFrame, decision_tree: DecisionTree) -> BitmapIndex:
+    """
+    Generates a bitmap index with the same thresholds as a decision tree,
+    whatever number of buckets it was built with and whether or not every
+    type has its own thresholds.
+
+    :param df:
+        Pandas dataframe
+    :param decision_tree:
+        A decision tree created by create_decision_tree from df
+    :return:
+        A bitmap index
+    """
+    type_conversion_dictionaries = decision_tree.type_conversion_dictionaries()
+    conversion_dictionaries = list(type_conversion_dictionaries.values())
+    if all(dictionary == conversion_dictionaries[0] for dictionary in conversion_dictionaries):
+        return create_bitmap_index(df, conversion_dictionaries[0] if conversion_dictionaries else None)
+    return create_bitmap_index(df, find_quantiles(df, len(decision_tree.degrees())), type_conversion_dictionaries)
+
+
+def create_batch_query_engine(df: pd.DataFrame,
+                              conversion_dictionary: Optional[Dict[str, Tuple[Optional[float],
+                                                                              Optional[float]]]] = None,
+                              decision_tree: Optional[DecisionTree] = None) -> BatchQueryEngine:
+    """
+    Generates a batch query engine using the pandas dataframe, which
+    is used to evaluate many find queries at once.
+
+    :param df:
+        Pandas dataframe
+    :param conversion_dictionary:
+        The degree to constraints mapping to use, find_quantiles(df) by default
+    :param decision_tree:
+        A decision tree built from df with the "sorted_array" backend. If it is
+        given, the engine shares its range indexes and thresholds instead of
+        building its own, and conversion_dictionary is ignored
+    :return:
+        A batch query engine
+    """
+    if decision_tree is not None:
+        return BatchQueryEngine.from_decision_tree(decision_tree)
+    return BatchQueryEngine.from_dataframe(df, find_quantiles(df) if conversion_dictionary is None
+                                           else conversion_dictionary)
+
+
+def create_answer_table(df: pd.DataFrame,
+                        conversion_dictionary: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None) \
+        -> AnswerTable:
+    """
+    Generates an (unbuilt) answer table using the pandas dataframe. Call
+    build or build_in_background on the result to materialize every answer.
+
+    The table is only used by a decision tree built with the same thresholds,
+    so it is never used by a tree with per-type thresholds.
+
+    :param df:
+        Pandas dataframe
+    :param conversion_dictionary:
+        The degree to constraints mapping to use, find_quantiles(df) by default
+    :return:
+        An answer table
+    """
+    if conversion_dictionary is None:
+        conversion_dictionary = find_quantiles(df)
+    return AnswerTable(df, conversion_dictionary, dataset_version(df, conversion_dictionary))
+
+
+def create_histogram_cache(df: pd.DataFrame, bins: int = 30) -> HistogramCache:
+    """
+    Generates the histogram of every stat of every pokemon type (and of
+    every pokemon), which is used to draw plot queries.
+
+    :param df:
+        Pandas dataframe
+    :param bins:
+        The number of bins in every histogram
+    :return:
+        A histogram cache
+    """
+    return HistogramCache(df, group_rows_by_type(df), bins)
+
+
+def create_name_index(df: pd.DataFrame) -> NameIndex:
+    """
+    Generates the index used to look up pokemon by name, by prefix or with typos.
+
+    :param df:
+        Pandas dataframe
+    :return:
+        A name index over the name column of df
+    """
+    return NameIndex(df.loc[:, "name"].unique())
 
 
 def mask_df(df: pd.DataFrame, pokemon_type: str) -> pd.DataFrame:
@@ -141,7 +582,8 @@ def mask_df(df: pd.DataFrame, pokemon_type: str) -> pd.DataFrame:
     return df_masked
 
 
-def create_bst(names: np.ndarray, stat_list: np.ndarray) -> BinarySearchTree:
+def create_bst(names: np.ndarray, stat_list: np.ndarray,
+               stat_columns: Optional[Dict[str, np.ndarray]] = None) -> BinarySearchTree:
     """
     This function creates a BST given a numpy array of pokemon names
     and stat values.
@@ -152,18 +594,43 @@ def create_bst(names: np.ndarray, stat_list: np.ndarray) -> BinarySearchTree:
         A list of a particular stat pokemon stat, where
         the pokemon at index i in names has a stat value
         equal to the value of stat_list at index i
+    :param stat_columns:
+        The other stats of the same pokemon, by stat name, to store with every pokemon
     :return:
         A BST
     """
-    names = names.to_numpy()
-    stat_list = stat_list.to_numpy()
+    # Sort once (with the same tie order repeated insertion would produce)
+    # and bulk-load a balanced tree instead of inserting row by row
+    sorted_index = create_sorted_index(names, stat_list, stat_columns)
+
+    stats = {stat: sorted_index.stat_values(stat).tolist() for stat in sorted_index.stat_columns}
+    return BinarySearchTree.from_sorted(sorted_index.values.tolist(), sorted_index.names.tolist(), stats)
 
-    new_bst = BinarySearchTree(None, None)
 
-    for i, item in enumerate(stat_list):
-        new_bst.insert(item, pokemon=names[i])
+def create_sorted_index(names: np.ndarray, stat_list: np.ndarray,
+                        stat_columns: Optional[Dict[str, np.ndarray]] = None,
+                        rows: Optional[np.ndarray] = None) -> SortedArrayIndex:
+    """
+    This function creates a sorted-array range index given pokemon names
+    and stat values. It is a drop-in replacement for create_bst.
 
-    return new_bst
+    :param names:
+        A numpy array (or pandas series) of pokemon names
+    :param stat_list:
+        A numpy array (or pandas series) of a particular pokemon stat, where
+        the pokemon at index i in names has a stat value
+        equal to the value of stat_list at index i
+    :param stat_columns:
+        Other stat columns, by stat name, that the index can aggregate
+    :param rows:
+        The row of every pokemon in stat_columns, by default the pokemon are
+        the rows of stat_columns in order
+    :return:
+        A sorted-array index
+    """
+    if stat_columns is not None:
+        stat_columns = {stat: np.asarray(column) for stat, column in stat_columns.items()}
+    return SortedArrayIndex.from_unsorted(np.asarray(names), np.asarray(stat_list), rows, stat_columns)
 
 
 def fetch_values(type_filter: str, stat: str, df: pd.DataFrame) -> pd.DataFrame:
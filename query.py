@@ -0,0 +1,210 @@
+"""
+Query Module
+===============================
+The functions/classes defined in this class are responsible for parsing user
+queries into query plans, which record what a query asks for and which query
+structure evaluates it. They do not depend on the GUI, so queries can also be
+run without a display.
+
+A query is split into tokens once, and every token is checked against sets
+that are built once when this module is imported, so a query can be parsed
+and planned on every keystroke.
+
+The grammar of a query is:
+    - find <type> <degree> <stat> [<degree> <stat> ...]
+    - find <type> top|bottom <k> <stat>
+    - count|sum|mean|min|max <type> <degree> <stat> [<target stat>]
+    - plot <type> <stat>
+where <type> is a pokemon type or "all". An aggregate query aggregates the
+stat it filters on, or <target stat> if it is given.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from typing import Collection, List, Optional, Tuple
+
+TYPES = frozenset({'flying', 'ice', 'psychic', 'ghost', 'water', 'ground', 'steel',
+                   'rock', 'fighting', 'fire', 'electric', 'poison', 'grass', 'bug', 'dark', 'normal', 'fairy',
+                   'dragon', 'all'})
+
+STATS = frozenset({'attack', 'defense', 'sp_attack', 'sp_defense', 'hp', 'speed'})
+
+# The degrees of a decision tree built with the default three buckets
+DEFAULT_DEGREES = frozenset({'high', 'medium', 'low'})
+
+# The aggregate functions a query can compute over the stat it filters on
+AGGREGATES = frozenset({'count', 'sum', 'mean', 'min', 'max'})
+
+# The directions of a ranked find query
+RANKINGS = frozenset({'top', 'bottom'})
+
+# How a query is evaluated:
+#   - "tree": on the range index of one type in the DecisionTree, which also
+#     answers from its answer table and query cache when they have the query
+#   - "union": on the range index of every type in the DecisionTree, merged,
+#     for a query on the type "all"
+#   - "bitmap": by intersecting the condition bitmaps of the BitmapIndex, for
+#     a find query with several conditions
+#   - "histogram": from the precomputed histograms of the HistogramCache
+PATHS = ("tree", "union", "bitmap", "histogram")
+
+
+class QueryPlan:
+    """
+    A class that represents a parsed query and the path it is evaluated on
+
+    Instance Attributes:
+        - text: The query, as it was typed
+        - action: "find", "plot" or one of AGGREGATES
+        - pokemon_type: The pokemon type the query is about, or "all"
+        - conditions: The (degree, stat) conditions of the query, in the order they were given
+        - stat: The stat the query filters on, ranks, aggregates or plots
+        - target_stat: The stat an aggregate query aggregates instead of stat, None
+        if it aggregates stat
+        - ranking: The (direction, k) of a ranked find query, None for any other query
+        - path: How the query is evaluated (one of PATHS)
+
+    Representation Invariants:
+        - self.action in {'find', 'plot'} or self.action in AGGREGATES
+        - self.ranking is None or (self.ranking[0] in RANKINGS and self.ranking[1] > 0)
+        - self.ranking is None or self.conditions == []
+        - self.target_stat is None or self.action in AGGREGATES
+        - self.action != 'plot' or self.conditions == []
+        - self.path in PATHS
+    """
+    text: str
+    action: str
+    pokemon_type: str
+    conditions: List[Tuple[str, str]]
+    stat: str
+    target_stat: Optional[str]
+    ranking: Optional[Tuple[str, int]]
+    path: str
+
+    def __init__(self, text: str, action: str, pokemon_type: str, conditions: List[Tuple[str, str]],
+                 stat: str, ranking: Optional[Tuple[str, int]] = None, target_stat: Optional[str] = None) -> None:
+        """Initialize a plan for a parsed query, and choose the path it is evaluated on.
+        """
+        self.text = text
+        self.action = action
+        self.pokemon_type = pokemon_type
+        self.conditions = conditions
+        self.stat = stat
+        self.target_stat = target_stat
+        self.ranking = ranking
+        self.path = _choose_path(self)
+
+    def tree_query(self) -> List[str]:
+        """
+        Return this query in the format the DecisionTree evaluates, for a query
+        planned on the "tree" or "union" path.
+
+        >>> parse_query("find water top 10 speed").tree_query()
+        ['water', 'speed', 'top 10']
+
+        :return:
+            ["type", "stat", "degree" + " " + "stat"], or
+            ["type", "stat", "top" + " " + "k"] for a ranked query
+        """
+        if self.ranking is not None:
+            return [self.pokemon_type, self.stat, self.ranking[0] + " " + str(self.ranking[1])]
+        degree, stat = self.conditions[0]
+        return [self.pokemon_type, stat, degree + " " + stat]
+
+    def bitmap_query(self) -> List[str]:
+        """
+        Return this query in the format the BitmapIndex evaluates.
+
+        :return:
+            ["type", "degree" + " " + "stat", "degree" + " " + "stat", ...]
+        """
+        return [self.pokemon_type] + [degree + " " + stat for degree, stat in self.conditions]
+
+
+def parse_query(query: str, degree_set: Optional[Collection[str]] = None) -> Optional[QueryPlan]:
+    """
+    Parses a query into a query plan.
+
+    >>> plan = parse_query("find all high attack")
+    >>> plan.pokemon_type, plan.conditions, plan.path
+    ('all', [('high', 'attack')], 'union')
+    >>> parse_query("find fire high attack low hp").path
+    'bitmap'
+    >>> parse_query("find fire attack") is None
+    True
+    >>> parse_query("plot fire high attack") is None
+    True
+    >>> plan = parse_query("mean dragon medium attack speed")
+    >>> plan.conditions, plan.target_stat
+    ([('medium', 'attack')], 'speed')
+
+    :param query:
+        A query
+    :param degree_set:
+        The valid degrees, "low", "medium" and "high" by default (see
+        DecisionTree.degrees for the degrees of a tree built with more buckets)
+    :return:
+        The plan of the query, or None if the query is malformed
+    """
+    tokens = query.split(" ")
+    if degree_set is None:
+        degree_set = DEFAULT_DEGREES
+
+    if len(tokens) < 3 or tokens[1] not in TYPES or tokens[-1] not in STATS:
+        return None
+    action, pokemon_type, stat = tokens[0], tokens[1], tokens[-1]
+
+    if action == 'plot':
+        # A plot draws every pokemon of the type, so it takes no degree
+        if len(tokens) == 3:
+            return QueryPlan(query, action, pokemon_type, [], stat)
+    elif action in AGGREGATES:
+        if len(tokens) == 4 and tokens[2] in degree_set:
+            return QueryPlan(query, action, pokemon_type, [(tokens[2], stat)], stat)
+        # An aggregate of another stat, such as "mean dragon medium attack speed"
+        elif len(tokens) == 5 and tokens[2] in degree_set and tokens[3] in STATS:
+            return QueryPlan(query, action, pokemon_type, [(tokens[2], tokens[3])], tokens[3],
+                             target_stat=None if stat == tokens[3] else stat)
+    elif action == 'find':
+        # A ranked find query, such as "find water top 10 speed"
+        if len(tokens) == 5 and tokens[2] in RANKINGS:
+            if tokens[3].isdigit() and int(tokens[3]) > 0:
+                return QueryPlan(query, action, pokemon_type, [], stat, (tokens[2], int(tokens[3])))
+        # A find query with one or more "degree stat" conditions
+        elif len(tokens) % 2 == 0:
+            conditions = [(tokens[i], tokens[i + 1]) for i in range(2, len(tokens), 2)]
+            if all(degree in degree_set and condition_stat in STATS for degree, condition_stat in conditions):
+                return QueryPlan(query, action, pokemon_type, conditions, conditions[0][1])
+    return None
+
+
+def _choose_path(plan: QueryPlan) -> str:
+    """
+    Return the path (one of PATHS) a query plan is evaluated on.
+    """
+    if plan.action == 'plot':
+        return "histogram"
+    elif len(plan.conditions) > 1:
+        return "bitmap"
+    elif plan.pokemon_type == 'all':
+        return "union"
+    else:
+        return "tree"
+
+
+def check_query(q: str, degree_set: Optional[Collection[str]] = None) -> bool:
+    """
+    This function check if a query is valid by making sure it is in the
+    proper format. For more information about the format, please check
+    the instructions to run my program in the project report.
+
+    :param q:
+        A query
+    :param degree_set:
+        The valid degrees, "low", "medium" and "high" by default (see
+        DecisionTree.degrees for the degrees of a tree built with more buckets)
+    :return:
+        A boolean which represents if the query is valid or not
+    """
+    return parse_query(q, degree_set) is not None
@@ -0,0 +1,174 @@
+"""
+Query Cache Module
+===============================
+The functions/classes defined in this class are responsible for caching
+the results of evaluated queries, so that re-submitting a query (or flipping
+back and forth between two) does not evaluate it again.
+
+Every cached result is tagged with the version of the dataset and
+thresholds it was computed from. Looking a result up under a different
+version clears the cache, so stale results are never returned.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class QueryCache:
+    """
+    A class that represents a bounded least-recently-used cache of query results
+
+    Instance Attributes:
+        - maxsize: The maximum number of results kept in the cache
+        - version: The dataset version of every result currently in the cache
+        - hits: The number of lookups answered from the cache
+        - misses: The number of lookups that had to be evaluated
+        - invalidations: The number of times the cache was cleared because
+        the dataset version changed
+
+    Private Instance Attributes:
+        - _entries: The cached results, ordered from least to most recently used
+        - _lock: A lock guarding the cache, so it can be shared between threads
+
+    Representation Invariants:
+        - self.maxsize > 0
+        - len(self._entries) <= self.maxsize
+    """
+    maxsize: int
+    version: Optional[Hashable]
+    hits: int
+    misses: int
+    invalidations: int
+    _entries: OrderedDict
+    _lock: Lock
+
+    def __init__(self, maxsize: int = 128) -> None:
+        """Initialize an empty cache that holds at most maxsize results.
+        """
+        assert maxsize > 0
+
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get_or_compute(self, key: Hashable, version: Optional[Hashable], compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for key, or call compute to evaluate it and
+        cache the result.
+
+        If version is not the version of the cached results, then the dataset
+        has changed since they were computed, and the cache is cleared first.
+
+        >>> cache = QueryCache(maxsize=2)
+        >>> cache.get_or_compute(("fire", "attack", "high attack"), "v1", lambda: ["Victini"])
+        ['Victini']
+        >>> cache.get_or_compute(("fire", "attack", "high attack"), "v1", lambda: [])
+        ['Victini']
+        >>> cache.get_or_compute(("fire", "attack", "high attack"), "v2", lambda: [])
+        []
+        >>> cache.info()
+        {'hits': 1, 'misses': 2, 'invalidations': 1, 'size': 1, 'maxsize': 2}
+
+        :param key:
+            A normalized query
+        :param version:
+            The version of the dataset and thresholds the query is evaluated against
+        :param compute:
+            A function which evaluates the query
+        :return:
+            The result of the query
+        """
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            self.misses += 1
+
+        # Evaluate outside the lock, so a slow query does not block other lookups
+        result = compute()
+        self.put(key, version, result)
+        return result
+
+    def get(self, key: Hashable, version: Optional[Hashable]) -> Optional[Any]:
+        """
+        Return the cached result for key, or None if it is not cached. Unlike
+        get_or_compute, a miss does not evaluate the query, so the caller can
+        evaluate it lazily and put the result once it is complete.
+
+        >>> cache = QueryCache(maxsize=2)
+        >>> cache.get("find fire high attack", "v1") is None
+        True
+        >>> cache.put("find fire high attack", "v1", ["Victini"])
+        >>> cache.get("find fire high attack", "v1")
+        ['Victini']
+
+        :param key:
+            A normalized query
+        :param version:
+            The version of the dataset and thresholds the query is evaluated against
+        :return:
+            The cached result of the query, or None
+        """
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, version: Optional[Hashable], result: Any) -> None:
+        """
+        Cache the complete result of a query, unless the dataset version has
+        changed since the query was looked up.
+
+        :param key:
+            A normalized query
+        :param version:
+            The version of the dataset and thresholds the query was evaluated against
+        :param result:
+            The result of the query
+        """
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def _check_version(self, version: Optional[Hashable]) -> None:
+        """
+        Clear the cache if version is not the version of the cached results.
+        The caller must hold self._lock.
+        """
+        if version != self.version:
+            if len(self._entries) > 0:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def clear(self) -> None:
+        """Remove every result from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> Dict[str, int]:
+        """Return the hit/miss statistics of this cache.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                    "size": len(self._entries), "maxsize": self.maxsize}
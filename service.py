@@ -0,0 +1,335 @@
+"""
+Query Service Module
+===============================
+The functions/classes defined in this class are responsible for serving
+queries over HTTP, so that many clients can share one loaded copy of the
+query structures instead of each starting main.py and rebuilding them.
+
+The service only uses the standard library's threading HTTP server. Each
+connection is handled on its own thread, which hands its query to a fixed
+pool of worker threads. Find queries with one stat condition that arrive at
+around the same time are collected into one batch and answered together by
+the BatchQueryEngine.
+
+Endpoints:
+    - GET /find?q=<query>: the result of a find query
+    - GET /plot?q=<query>: the stat values a plot query would plot
+    - POST /query: the results of {"queries": [<query>, ...]}, in order
+    - GET /stats: the number of queries and batches served so far
+
+Run it with "python service.py --port 8000" and load test it with load_client.py.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import queue
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+from batch import evaluate_plan
+from batch_query import BatchQueryEngine
+from bitmap_index import BitmapIndex
+from decision_tree import DecisionTree
+from metrics import METRICS, COUNT_BOUNDS
+from query import QueryPlan, parse_query
+
+
+class QueryService:
+    """
+    A class that evaluates queries on a pool of worker threads, batching
+    together find queries with one stat condition
+
+    Instance Attributes:
+        - df: pandas dataframe after loading in our data
+        - decision_tree: The decision tree used to evaluate find queries that are not batched
+        - bitmap_index: The bitmap index used to evaluate find queries with several stat conditions
+        - engine: The engine used to evaluate batches of find queries
+        - max_batch: The maximum number of queries in one batch
+        - max_delay: How long (in seconds) the first query of a batch waits
+        for more queries to join it
+        - queries: The number of queries evaluated so far
+        - batches: The number of batches evaluated so far
+
+    Private Instance Attributes:
+        - _executor: The worker threads queries and batches are evaluated on
+        - _pending: The (query, (type, degree, stat), future) tuples waiting to be batched,
+        None tells the batching thread to stop
+        - _degrees: The degrees of the decision tree, which queries are parsed with
+        - _batcher: The thread that collects pending queries into batches
+        - _lock: A lock guarding the counters
+
+    Representation Invariants:
+        - self.max_batch >= 1
+        - self.max_delay >= 0
+    """
+    df: pd.DataFrame
+    decision_tree: DecisionTree
+    bitmap_index: BitmapIndex
+    engine: BatchQueryEngine
+    max_batch: int
+    max_delay: float
+    queries: int
+    batches: int
+    _executor: ThreadPoolExecutor
+    _pending: queue.Queue
+    _batcher: Thread
+    _lock: Lock
+    _degrees: List[str]
+
+    def __init__(self, df: pd.DataFrame, decision_tree: DecisionTree, bitmap_index: BitmapIndex,
+                 engine: BatchQueryEngine, workers: int = 4, max_batch: int = 256,
+                 max_delay: float = 0.001) -> None:
+        self.df = df
+        self.decision_tree = decision_tree
+        self.bitmap_index = bitmap_index
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queries = 0
+        self.batches = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-worker")
+        self._pending = queue.Queue()
+        self._lock = Lock()
+        self._degrees = decision_tree.degrees()
+        self._batcher = Thread(target=self._collect_batches, name="query-batcher", daemon=True)
+        self._batcher.start()
+
+    def submit(self, query: str) -> Future:
+        """
+        Starts evaluating a query.
+
+        :param query:
+            A query, as it would be typed into the GUI
+        :return:
+            A future of the JSON object of the query, in the format of batch.evaluate_query
+        """
+        plan = parse_query(query, self._degrees)
+
+        # Only find queries with one condition on one type are batched, so
+        # every query returns what the GUI would return for it
+        if plan is not None and plan.action == "find" and plan.path == "tree" and plan.ranking is None:
+            degree, stat = plan.conditions[0]
+            future = Future()
+            self._pending.put((query, (plan.pokemon_type, degree, stat), future))
+            return future
+
+        return self._executor.submit(self._evaluate, query, plan)
+
+    def evaluate_many(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Evaluates queries concurrently and returns their JSON objects in order.
+        """
+        futures = [self.submit(query) for query in queries]
+        return [future.result() for future in futures]
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of queries and batches evaluated so far.
+        """
+        with self._lock:
+            return {"queries": self.queries, "batches": self.batches}
+
+    def close(self) -> None:
+        """Stop the batching thread and the workers.
+        """
+        self._pending.put(None)
+        self._batcher.join()
+        self._executor.shutdown(wait=True)
+
+    def _evaluate(self, query: str, plan: Optional[QueryPlan]) -> Dict[str, Any]:
+        """Evaluate a query that is not batched, given its plan (None if it is malformed).
+        """
+        with self._lock:
+            self.queries += 1
+        if plan is None:
+            return {"query": query, "error": "malformed query"}
+        try:
+            return evaluate_plan(plan, self.df, self.decision_tree, self.bitmap_index)
+        except Exception as error:  # Reported to the client, like in a batch
+            return {"query": query, "error": str(error)}
+
+    def _collect_batches(self) -> None:
+        """
+        Collect pending queries into batches and hand every batch to a worker.
+        A batch is closed once it is full, or max_delay after its first query arrived.
+        """
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._pending.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._executor.submit(self._evaluate_batch, batch)
+                    return
+                batch.append(item)
+
+            self._executor.submit(self._evaluate_batch, batch)
+
+    def _evaluate_batch(self, batch: List[Tuple[str, Tuple[str, str, str], Future]]) -> None:
+        """Evaluate a batch of find queries and resolve the future of each of them.
+        """
+        with self._lock:
+            self.queries += len(batch)
+            self.batches += 1
+        if METRICS.enabled:
+            METRICS.observe("service batch size", len(batch), COUNT_BOUNDS)
+
+        try:
+            results = self.engine.evaluate_batch([engine_query for _, engine_query, _ in batch])
+        except Exception as error:  # Every query in the batch fails with the same error
+            for query, _, future in batch:
+                future.set_result({"query": query, "error": str(error)})
+            return
+
+        for (query, _, future), result in zip(batch, results):
+            future.set_result({"query": query, "count": len(result), "results": result.tolist()})
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """
+    A class that handles one HTTP request to the query service. The service
+    is shared by every request through the server's service attribute.
+    """
+    server: QueryServer
+
+    def do_GET(self) -> None:
+        """Handle the /find, /plot and /stats endpoints.
+        """
+        url = urlparse(self.path)
+
+        if url.path == "/stats":
+            self.send_json(200, self.server.service.stats())
+            return
+        if url.path not in {"/find", "/plot"}:
+            self.send_json(404, {"error": "unknown endpoint " + url.path})
+            return
+
+        query = parse_qs(url.query).get("q", [""])[0].strip()
+        if query.split(" ")[0] != url.path[1:]:
+            self.send_json(400, {"query": query, "error": "expected a " + url.path[1:] + " query"})
+            return
+
+        self.send_record(self.server.service.submit(query).result())
+
+    def do_POST(self) -> None:
+        """Handle the /query endpoint, which evaluates a list of queries.
+        """
+        if urlparse(self.path).path != "/query":
+            self.send_json(404, {"error": "unknown endpoint " + self.path})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            queries = [str(query).strip() for query in body["queries"]]
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {"error": "expected a JSON object of the form {\"queries\": [...]}"})
+            return
+
+        self.send_json(200, {"results": self.server.service.evaluate_many(queries)})
+
+    def send_record(self, record: Dict[str, Any]) -> None:
+        """Send the JSON object of one query, with status 400 if the query failed.
+        """
+        self.send_json(400 if "error" in record else 200, record)
+
+    def send_json(self, status: int, body: Any) -> None:
+        """Send a JSON response.
+        """
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Do not log every request, which would dominate the time of small queries.
+        """
+
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    A class that represents a threading HTTP server with a query service
+
+    Instance Attributes:
+        - service: The service that evaluates the queries of every request
+    """
+    daemon_threads = True
+    # The default backlog of 5 makes concurrent clients wait for connection retries
+    request_queue_size = 128
+    service: QueryService
+
+    def __init__(self, address: Tuple[str, int], service: QueryService) -> None:
+        super().__init__(address, QueryRequestHandler)
+        self.service = service
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line arguments of the service
+    """
+    parser = argparse.ArgumentParser(description="Pokemon recommender query service")
+    parser.add_argument("--data", default="data/pokemon.csv", help="the pokemon CSV file to load")
+    parser.add_argument("--host", default="127.0.0.1", help="the address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="the port to listen on")
+    parser.add_argument("--workers", type=int, default=4, help="the number of worker threads")
+    parser.add_argument("--max-batch", type=int, default=256,
+                        help="the maximum number of find queries evaluated in one batch")
+    parser.add_argument("--metrics", metavar="FILE", default=None,
+                        help="record stage timers, query latencies and tree shapes, and write them to "
+                             "FILE as JSON every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="the number of seconds between writes of the --metrics file")
+    parser.add_argument("--max-delay-ms", type=float, default=1.0,
+                        help="how long a find query waits for other queries to join its batch")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    # Imported here so that --help does not load the data
+    from process import create_batch_query_engine, create_tree_bitmap_index
+    from query_cache import QueryCache
+    from snapshot import load_or_build
+
+    if args.metrics is not None:
+        METRICS.enabled = True
+        METRICS.start_dump_thread(args.metrics, args.metrics_interval)
+
+    df, decision_tree, _ = load_or_build(args.data)
+    if METRICS.enabled:
+        METRICS.record_tree_shape(decision_tree)
+    decision_tree.set_cache(QueryCache(maxsize=256))
+    service = QueryService(df, decision_tree, create_tree_bitmap_index(df, decision_tree),
+                           create_batch_query_engine(df, decision_tree=decision_tree), workers=args.workers,
+                           max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000)
+
+    server = QueryServer((args.host, args.port), service)
+    print("Serving queries on http://{}:{}".format(*server.server_address[:2]), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        METRICS.stop_dump_thread()
+
+
+if __name__ == '__main__':
+    main()
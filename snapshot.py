@@ -0,0 +1,277 @@
+"""
+Snapshot Module
+===============================
+The functions/classes defined in this class are responsible for saving the
+built query structures to a binary snapshot on disk, and memory-mapping that
+snapshot on the next start instead of parsing the CSV and rebuilding every tree.
+
+A snapshot is a directory of .npy arrays (so each one can be opened with
+np.load(mmap_mode='r')) plus a small JSON header. It is keyed on a content
+hash of the CSV, so a snapshot of an older version of the dataset is never used.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+from decision_tree import DecisionTree
+from sorted_index import SortedArrayIndex
+from stats_store import StatsStore
+from metrics import METRICS
+from process import DATA_PATH, read_data, create_decision_tree, generate_pokemon_to_stats_mapping
+
+# Bump this whenever the layout of a snapshot changes, so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 5
+
+SNAPSHOT_DIR = "data/snapshot"
+
+# The number of snapshots kept, so runs with different datasets or threshold
+# options do not overwrite each other's snapshots
+MAX_SNAPSHOTS = 4
+
+# The prefix of the temporary directory a snapshot is written to
+TEMP_PREFIX = "tmp-"
+
+STATS = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
+
+
+def csv_hash(csv_path: str) -> str:
+    """
+    Computes the content hash of a CSV file, which is used as the key of its snapshot.
+
+    :param csv_path:
+        The path of the CSV file
+    :return:
+        The SHA-256 hex digest of the file's contents
+    """
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_snapshot(df: pd.DataFrame, decision_tree: DecisionTree, key: str,
+                  snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    """
+    Saves the dataset columns the program uses and a decision tree built with
+    the "sorted_array" backend to a snapshot. Only the MAX_SNAPSHOTS most
+    recently saved snapshots are kept.
+
+    Preconditions:
+        - decision_tree was built from df by create_decision_tree(df, backend="sorted_array")
+
+    :param df:
+        A pandas dataframe
+    :param decision_tree:
+        The decision tree built from df
+    :param key:
+        The content hash of the CSV df was read from, followed by the threshold
+        options of the tree if they are not the defaults (see load_or_build)
+    :param snapshot_dir:
+        The directory snapshots are stored in
+    :return:
+        The path of the new snapshot
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    # Write into a temporary directory and rename it at the end, so a
+    # half-written snapshot is never picked up
+    temp_dir = tempfile.mkdtemp(prefix=TEMP_PREFIX, dir=snapshot_dir)
+
+    # The types are stored as category codes (-1 for no second type), so they
+    # can be loaded as categorical columns on top of the mapped arrays
+    categories = sorted(set(df.loc[:, "type1"].dropna()) | set(df.loc[:, "type2"].dropna()))
+    arrays = {
+        "names": df.loc[:, "name"].to_numpy().astype(str),
+        "pokedex_number": df.loc[:, "pokedex_number"].to_numpy().astype(np.int64),
+        "stats": df.loc[:, STATS].to_numpy().astype(np.int64),
+        "type1": pd.Categorical(df.loc[:, "type1"].astype(object), categories=categories).codes.astype(np.int8),
+        "type2": pd.Categorical(df.loc[:, "type2"].astype(object), categories=categories).codes.astype(np.int8),
+    }
+
+    # Every (type, stat) index is stored back to back, index i being
+    # index_values[index_offsets[i]:index_offsets[i + 1]]
+    types = []
+    indexes = []
+    for type_tree in decision_tree.subtrees:
+        types.append(type_tree.category)
+        for stat_tree in type_tree.subtrees:
+            indexes.append(stat_tree.subtrees[0])
+    index_stats = [stat_tree.category for stat_tree in decision_tree.subtrees[0].subtrees]
+
+    arrays["index_offsets"] = np.concatenate(([0], np.cumsum([len(index.values) for index in indexes])))
+    arrays["index_values"] = np.concatenate([index.values for index in indexes]).astype(np.int64)
+    arrays["index_names"] = np.concatenate([index.names for index in indexes]).astype(str)
+    # The row in "stats" of every indexed pokemon, so an index can aggregate
+    # a stat other than the one it is sorted by
+    arrays["index_rows"] = np.concatenate([index.rows for index in indexes]).astype(np.int64)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(temp_dir, name + ".npy"), array)
+
+    # The thresholds are stored per type, since a tree can have per-type thresholds
+    thresholds = decision_tree.type_conversion_dictionaries()
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "key": key,
+        "version": decision_tree.version,
+        "types": types,
+        "categories": categories,
+        "index_stats": index_stats,
+        "thresholds": {pokemon_type: {conversion_key: [None if bound is None else float(bound)
+                                                       for bound in threshold]
+                                      for conversion_key, threshold in type_thresholds.items()}
+                       for pokemon_type, type_thresholds in thresholds.items()}
+    }
+    with open(os.path.join(temp_dir, "header.json"), "w") as file:
+        json.dump(header, file)
+
+    path = os.path.join(snapshot_dir, key)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temp_dir, path)
+
+    # Snapshots that have not been saved recently (such as those of older versions
+    # of the dataset) are removed, but snapshots still being written are not
+    snapshots = [os.path.join(snapshot_dir, entry) for entry in os.listdir(snapshot_dir)
+                 if not entry.startswith(TEMP_PREFIX)]
+    snapshots.sort(key=_modified_time, reverse=True)
+    for old_path in snapshots[MAX_SNAPSHOTS:]:
+        if old_path != path:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+    return path
+
+
+def _modified_time(path: str) -> float:
+    """
+    Return when path was last modified, or 0 if it no longer exists.
+    """
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+@METRICS.timed("load")
+def load_snapshot(key: str, snapshot_dir: str = SNAPSHOT_DIR) \
+        -> Optional[Tuple[pd.DataFrame, DecisionTree, StatsStore]]:
+    """
+    Memory-maps the snapshot of the given key.
+
+    :param key:
+        The key the snapshot was saved under
+    :param snapshot_dir:
+        The directory snapshots are stored in
+    :return:
+        A (dataframe, decision tree, pokemon to stats mapping) tuple, or None
+        if there is no usable snapshot for key
+    """
+    path = os.path.join(snapshot_dir, key)
+    try:
+        with open(os.path.join(path, "header.json")) as file:
+            header = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if header.get("format") != SNAPSHOT_FORMAT or header.get("key") != key:
+        return None
+
+    # A missing, truncated or corrupt array makes the snapshot unusable, so it is rebuilt
+    arrays = {}
+    try:
+        for name in ["names", "pokedex_number", "stats", "type1", "type2",
+                     "index_offsets", "index_values", "index_names", "index_rows"]:
+            arrays[name] = np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    conversion_dictionaries = {pokemon_type: {conversion_key: tuple(threshold)
+                                              for conversion_key, threshold in type_thresholds.items()}
+                               for pokemon_type, type_thresholds in header["thresholds"].items()}
+
+    # Every index aggregates other stats from the same mapped stat columns
+    stat_columns = {stat: arrays["stats"][:, j] for j, stat in enumerate(STATS)}
+
+    # Rebuild the (tiny) decision tree skeleton around views of the mapped arrays
+    base_tree = DecisionTree(category=None, is_binary_parent=False, conversion_dictionary=None)
+    base_tree.version = header["version"]
+    offsets = arrays["index_offsets"]
+    i = 0
+    for pokemon_type in header["types"]:
+        type_tree = DecisionTree(category=pokemon_type, is_binary_parent=False, conversion_dictionary=None)
+        for stat in header["index_stats"]:
+            stat_tree = DecisionTree(category=stat, is_binary_parent=True,
+                                     conversion_dictionary=conversion_dictionaries[pokemon_type])
+            start, end = offsets[i], offsets[i + 1]
+            stat_tree.add_subtree(SortedArrayIndex(arrays["index_values"][start:end],
+                                                   arrays["index_names"][start:end],
+                                                   arrays["index_rows"][start:end], stat_columns))
+            type_tree.add_subtree(stat_tree)
+            i += 1
+        base_tree.add_subtree(type_tree)
+
+    # The names are turned into strings once, and shared by the dataframe and
+    # the stats store. The types stay as category codes on the mapped arrays
+    names = arrays["names"].tolist()
+    df = pd.DataFrame({"name": pd.Series(names, dtype=object),
+                       "pokedex_number": arrays["pokedex_number"],
+                       "type1": pd.Categorical.from_codes(arrays["type1"], header["categories"]),
+                       "type2": pd.Categorical.from_codes(arrays["type2"], header["categories"])})
+    for j, stat in enumerate(STATS):
+        df[stat] = arrays["stats"][:, j]
+
+    # The stats store reads the mapped stat columns directly
+    columns = dict(stat_columns)
+    columns["pokedex_id"] = arrays["pokedex_number"]
+    pokemon_to_stats = StatsStore(names, columns)
+
+    return df, base_tree, pokemon_to_stats
+
+
+def load_or_build(csv_path: str = DATA_PATH, snapshot_dir: str = SNAPSHOT_DIR, workers: Optional[int] = None,
+                  buckets: int = 3, per_type_thresholds: bool = False) \
+        -> Tuple[pd.DataFrame, DecisionTree, StatsStore]:
+    """
+    Loads the snapshot of a CSV file if there is an up to date one, otherwise
+    reads the CSV, builds everything and saves a snapshot for the next start.
+
+    :param csv_path:
+        The path of the CSV file
+    :param snapshot_dir:
+        The directory snapshots are stored in
+    :param workers:
+        The number of processes used to build the decision tree when there is no snapshot
+    :param buckets:
+        The number of degrees each stat is split into, see create_decision_tree
+    :param per_type_thresholds:
+        Whether each type has its own thresholds, see create_decision_tree
+    :return:
+        A (dataframe, decision tree, pokemon to stats mapping) tuple
+    """
+    key = csv_hash(csv_path)
+    # Trees built with other thresholds are kept under a different key
+    if buckets != 3 or per_type_thresholds:
+        key += "-" + str(buckets) + ("-per-type" if per_type_thresholds else "")
+
+    loaded = load_snapshot(key, snapshot_dir)
+    if loaded is not None:
+        return loaded
+
+    df = read_data(csv_path)
+    decision_tree = create_decision_tree(df, backend="sorted_array", workers=workers, buckets=buckets,
+                                         per_type_thresholds=per_type_thresholds)
+    pokemon_to_stats = generate_pokemon_to_stats_mapping(df)
+
+    try:
+        save_snapshot(df, decision_tree, key, snapshot_dir)
+    except OSError:
+        pass  # The snapshot is only an optimization, so a read-only disk is not an error
+
+    return df, decision_tree, pokemon_to_stats
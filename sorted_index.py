@@ -0,0 +1,275 @@
+"""
+Sorted Index Module
+===============================
+The functions/classes defined in this class are responsible for representing
+a columnar range index over a pokemon stat. The index stores two parallel,
+contiguous arrays (sorted stat values and the matching pokemon names), and
+answers range lookups with binary search instead of walking a pointer tree.
+
+It exposes the same query interface as BinarySearchTree, so a DecisionTree
+can use either one as its binary child.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from operator import methodcaller
+from typing import Optional, Tuple, Iterator, Dict, List
+import numpy as np
+from metrics import METRICS
+
+
+class SortedArrayIndex:
+    """
+    A class that represents a sorted-array range index
+
+    Instance Attributes:
+        - values: The stat values of the indexed pokemon, sorted in
+        ascending order
+        - names: The pokemon names, where names[i] is the pokemon whose
+        stat value is values[i]
+        - prefix_sums: The running sums of values, where prefix_sums[i] is the
+        sum of values[:i]
+        - rows: The row of names[i] in the stat columns, None if the index
+        was built without them
+        - stat_columns: The stat columns of the dataset, by stat name, used to
+        aggregate another stat of the indexed pokemon. They are shared by every
+        index of a decision tree, so an index only stores the rows of its pokemon
+
+    Private Instance Attributes:
+        - _stat_prefix_sums: The running sums of every other stat that has been
+        aggregated, in the order of this index, computed on first use
+
+    Representation Invariants:
+        - len(self.values) == len(self.names)
+        - len(self.prefix_sums) == len(self.values) + 1
+        - self.rows is None or len(self.rows) == len(self.values)
+        - self.stat_columns == {} or self.rows is not None
+        - all(self.values[i] <= self.values[i + 1] for i in range(len(self.values) - 1))
+    """
+    values: np.ndarray
+    names: np.ndarray
+    prefix_sums: np.ndarray
+    rows: Optional[np.ndarray]
+    stat_columns: Dict[str, np.ndarray]
+    _stat_prefix_sums: Dict[str, np.ndarray]
+
+    def __init__(self, values: np.ndarray, names: np.ndarray, rows: Optional[np.ndarray] = None,
+                 stat_columns: Optional[Dict[str, np.ndarray]] = None) -> None:
+        """Initialize a new index from stat values and names that are
+        already sorted by stat value, and optionally the rows of the same
+        pokemon in the given stat columns.
+
+        Preconditions:
+            - len(values) == len(names)
+            - values is sorted in ascending order
+            - stat_columns is None or rows is not None
+        """
+        self.values = values
+        self.names = names
+        self.prefix_sums = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+        self.rows = rows
+        self.stat_columns = {} if stat_columns is None else stat_columns
+        self._stat_prefix_sums = {}
+
+    @classmethod
+    def from_unsorted(cls, names: np.ndarray, stat_list: np.ndarray, rows: Optional[np.ndarray] = None,
+                      stat_columns: Optional[Dict[str, np.ndarray]] = None) -> SortedArrayIndex:
+        """Build an index from names and stat values given in dataset order,
+        and optionally their rows in the stat columns (the positions of the
+        pokemon by default), which are put in the same order.
+
+        Pokemon with equal stat values are ordered the same way a
+        BinarySearchTree built by repeated insertion would order them
+        (the most recently inserted pokemon comes first), so both backends
+        return identical results for every query.
+
+        >>> index = SortedArrayIndex.from_unsorted(np.array(["a", "b", "c"], dtype=object),
+        ...                                        np.array([20, 10, 20]))
+        >>> list(index.names)
+        ['b', 'c', 'a']
+        """
+        # Stable sort on the reversed arrays puts later rows before earlier
+        # rows whenever their values tie
+        reversed_order = np.argsort(stat_list[::-1], kind="stable")
+        order = len(stat_list) - 1 - reversed_order
+
+        if rows is None and stat_columns is not None:
+            rows = np.arange(len(stat_list))
+        if rows is not None:
+            rows = np.asarray(rows)[order]
+            # Rows take half the memory as 32-bit integers, which fit any dataset below 2 ** 31 rows
+            if len(rows) > 0 and rows.max() < 2 ** 31:
+                rows = rows.astype(np.int32)
+        return cls(np.ascontiguousarray(stat_list[order]), np.ascontiguousarray(names[order]), rows, stat_columns)
+
+    def stat_values(self, stat: str, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """Return another stat of the pokemon at positions start to end - 1 of
+        this index, in the order of this index.
+
+        Preconditions:
+            - stat in self.stat_columns
+        """
+        return self.stat_columns[stat][self.rows[start:end]]
+
+    def is_empty(self) -> bool:
+        """Return whether this index is empty.
+        """
+        return len(self.values) == 0
+
+    def find_nodes_with_constraints(self, threshold: Tuple[Optional[float], Optional[float]]) -> np.ndarray:
+        """
+        Given a threshold in the form of (Lower bound, Upper bound), this function finds
+        all pokemon in the index which have values that are in between the upper and lower
+        bounds (inclusive).
+
+        Missing bounds are treated exactly like BinarySearchTree.find_nodes_with_constraints
+        treats them, a missing lower bound becomes 0 and a missing upper bound becomes 500.
+
+        :param threshold:
+            A tuple in the form (Lower bound, upper bound), where either can be none.
+        :return:
+            A slice of the names array (a view, nothing is copied) containing all pokemon
+            names which have stat values that follow the constraints set out by the
+            threshold tuple, in ascending order of stat value.
+        """
+        start, end = self.position_range(threshold)
+        return self.names[start:end]
+
+    def iter_nodes_with_constraints(self, threshold: Tuple[Optional[float], Optional[float]]) -> Iterator[str]:
+        """
+        A lazy version of find_nodes_with_constraints, which yields the matching
+        pokemon names in ascending order of stat value.
+
+        :param threshold:
+            A tuple in the form (Lower bound, upper bound), where either can be none.
+        :return:
+            An iterator over the matching pokemon names
+        """
+        return iter(self.find_nodes_with_constraints(threshold))
+
+    def aggregate(self, threshold: Tuple[Optional[float], Optional[float]], function: str,
+                  target_stat: Optional[str] = None) -> Optional[float]:
+        """
+        Aggregates the stats of the pokemon that find_nodes_with_constraints would
+        return, in the same way as BinarySearchTree.aggregate. The range is found with
+        two binary searches, and its sum is the difference of two prefix sums.
+
+        Another stat of the same pokemon (target_stat) is summed with its own prefix
+        sums in this index's order, and its min and max are found over the range.
+
+        >>> index = SortedArrayIndex(np.array([10, 20, 30, 40]), np.array(["a", "b", "c", "d"]),
+        ...                          np.array([3, 2, 1, 0]), {"hp": np.array([1, 2, 3, 4])})
+        >>> [index.aggregate((15, 40), function) for function in ["count", "sum", "mean", "min", "max"]]
+        [3, 90, 30.0, 20, 40]
+        >>> index.aggregate((15, 40), "sum", "hp"), index.aggregate((15, 40), "max", "hp")
+        (6, 3)
+
+        Preconditions:
+            - function in {"count", "sum", "mean", "min", "max"}
+            - target_stat is None or target_stat in self.stat_columns
+        """
+        start, end = self.position_range(threshold)
+        count = end - start
+        if target_stat is None:
+            prefix_sums = self.prefix_sums
+        else:
+            prefix_sums = self._prefix_sums_of(target_stat)
+
+        if function == "count":
+            return count
+        elif function == "sum":
+            return int(prefix_sums[end] - prefix_sums[start])
+        elif count == 0:
+            return None
+        elif function == "mean":
+            return int(prefix_sums[end] - prefix_sums[start]) / count
+        elif target_stat is not None:
+            values = self.stat_values(target_stat, start, end)
+            return int(values.min() if function == "min" else values.max())
+        elif function == "min":
+            return int(self.values[start])
+        else:
+            assert function == "max"
+            return int(self.values[end - 1])
+
+    def _prefix_sums_of(self, stat: str) -> np.ndarray:
+        """Return the running sums of another stat in the order of this index,
+        computing them on first use.
+        """
+        prefix_sums = self._stat_prefix_sums.get(stat)
+        if prefix_sums is None:
+            prefix_sums = np.concatenate(([0], np.cumsum(self.stat_values(stat), dtype=np.int64)))
+            self._stat_prefix_sums[stat] = prefix_sums
+        return prefix_sums
+
+    def size(self) -> int:
+        """Return the number of pokemon in this index.
+        """
+        return len(self.values)
+
+    def rank(self, item: float) -> int:
+        """Return the number of pokemon in this index whose stat is smaller than item.
+        """
+        return int(np.searchsorted(self.values, item, side="left"))
+
+    def select(self, position: int) -> Tuple[int, str]:
+        """Return the stat and pokemon at the given position of this index in
+        ascending order of stat (starting at 0).
+        """
+        return self.values[position], self.names[position]
+
+    def items(self, start: int, end: int, stat: Optional[str] = None) -> List[Tuple[int, str]]:
+        """Return the (stat, pokemon) pairs at positions start to end - 1 of this
+        index in ascending order of stat. If stat is given, the pairs hold that
+        stat of each pokemon instead.
+        """
+        values = self.values[start:end] if stat is None else self.stat_values(stat, start, end)
+        return list(zip(values.tolist(), self.names[start:end].tolist()))
+
+    def iter_items(self, start: int, end: int, stat: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+        """A lazy version of items, which converts each stat value to a Python
+        number only when its pair is reached.
+
+        >>> list(SortedArrayIndex(np.array([10, 20, 30]), np.array(["a", "b", "c"])).iter_items(1, 3))
+        [(20, 'b'), (30, 'c')]
+        """
+        values = self.values[start:end] if stat is None else self.stat_values(stat, start, end)
+        return zip(map(methodcaller("item"), values), map(str, self.names[start:end]))
+
+    def position_range(self, threshold: Tuple[Optional[float], Optional[float]]) -> Tuple[int, int]:
+        """Return the (start, end) positions, in ascending order of stat, of the pokemon
+        find_nodes_with_constraints would return. While metrics are enabled, the
+        number of values probed and the size of the range are recorded in METRICS.
+        """
+        left_threshold = 0 if threshold[0] is None else threshold[0]
+        right_threshold = 500 if threshold[1] is None else threshold[1]
+        start = int(np.searchsorted(self.values, left_threshold, side="left"))
+        end = max(start, int(np.searchsorted(self.values, right_threshold, side="right")))
+
+        if METRICS.enabled:
+            # Each binary search probes about log2(n) values, like one root to leaf path of a BST
+            METRICS.record_search(2 * len(self.values).bit_length(), end - start)
+        return start, end
+
+    def find_top(self, k: int) -> np.ndarray:
+        """Return the k pokemon with the highest stats, highest first, in the
+        same order as BinarySearchTree.find_top.
+
+        >>> SortedArrayIndex(np.array([10, 20, 30]), np.array(["a", "b", "c"])).find_top(2).tolist()
+        ['c', 'b']
+        """
+        return self.names[max(0, len(self.names) - k):][::-1]
+
+    def find_bottom(self, k: int) -> np.ndarray:
+        """Return the k pokemon with the lowest stats, lowest first.
+        """
+        return self.names[:k]
+
+    def shape(self) -> Dict[str, int]:
+        """
+        Return the shape of this index, in the same form as BinarySearchTree.shape.
+        A binary search over the index behaves like a perfectly balanced tree.
+        """
+        height = len(self.values).bit_length()
+        return {"nodes": len(self.values), "height": height, "min_height": height, "max_imbalance": 0}
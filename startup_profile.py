@@ -0,0 +1,105 @@
+"""
+Startup Profile Module
+===============================
+The functions/classes defined in this class are responsible for measuring
+how long each part of the program's startup takes (importing modules,
+reading the data, building the trees and creating the window), so that
+regressions in time-to-first-window are visible.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+
+class StartupProfiler:
+    """
+    A class that records the wall time of startup imports and stages
+
+    Instance Attributes:
+        - enabled: Whether anything is recorded, a disabled profiler only
+        performs the imports and stages it is given
+        - records: The recorded (kind, name, seconds) measurements, in the
+        order they finished
+
+    Private Instance Attributes:
+        - _start: The time the profiler was created, used to report the total
+        - _open_stages: The start times of stages that were started but not stopped
+    """
+    enabled: bool
+    records: List[Tuple[str, str, float]]
+    _start: float
+    _open_stages: dict
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.records = []
+        self._start = time.perf_counter()
+        self._open_stages = {}
+
+    def import_module(self, name: str) -> ModuleType:
+        """
+        Imports a module, recording how long the import took. Modules that were
+        already imported (directly or as a dependency of an earlier import) cost
+        nothing, so each record only counts what that import newly loaded.
+
+        :param name:
+            The name of the module to import
+        :return:
+            The imported module
+        """
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        if self.enabled:
+            self.records.append(("import", name, time.perf_counter() - start))
+        return module
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        A context manager which records the wall time of a startup stage.
+
+        :param name:
+            The name of the stage
+        """
+        self.start_stage(name)
+        try:
+            yield
+        finally:
+            self.stop_stage(name)
+
+    def start_stage(self, name: str) -> None:
+        """Start timing a stage that does not fit in a single with block.
+        """
+        if self.enabled:
+            self._open_stages[name] = time.perf_counter()
+
+    def stop_stage(self, name: str) -> None:
+        """Stop timing a stage started with start_stage.
+        """
+        if self.enabled and name in self._open_stages:
+            self.records.append(("stage", name, time.perf_counter() - self._open_stages.pop(name)))
+
+    def report(self, file: Optional[TextIO] = None) -> None:
+        """
+        Writes a table of every recorded measurement.
+
+        :param file:
+            The file to write to, standard error by default
+        """
+        if not self.enabled:
+            return
+
+        file = sys.stderr if file is None else file
+        total = time.perf_counter() - self._start
+
+        print("Startup profile (wall time):", file=file)
+        for kind, name, seconds in self.records:
+            print("  {:<8}{:<32}{:>10.1f} ms".format(kind, name, seconds * 1000), file=file)
+        print("  {:<40}{:>10.1f} ms".format("total", total * 1000), file=file)
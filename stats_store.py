@@ -0,0 +1,104 @@
+"""
+Stats Store Module
+===============================
+The functions/classes defined in this class are responsible for storing the
+stats of every pokemon compactly.
+
+Instead of one dictionary per pokemon, every stat is stored in one contiguous
+integer array (one element per pokemon), and each name is interned to its row
+in those arrays. The store still reads like the old nested dictionary:
+store[name][stat] returns the stat of a pokemon.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from collections.abc import Mapping
+from typing import Dict, Iterator, Sequence
+import numpy as np
+
+# The fields stored for every pokemon
+FIELDS = ["attack", "defense", "sp_attack", "sp_defense", "speed", "hp", "pokedex_id"]
+
+
+class StatsStore(Mapping):
+    """
+    A class that represents a read-only mapping from pokemon names to their stats
+
+    Instance Attributes:
+        - names: The pokemon names, indexed by row
+        - columns: A mapping from a field in FIELDS to the array holding that
+        field for every pokemon, indexed by row
+
+    Private Instance Attributes:
+        - _rows: A mapping from a pokemon name to its row
+
+    Representation Invariants:
+        - all(len(column) == len(self.names) for column in self.columns.values())
+        - all(self.names[row] == name for name, row in self._rows.items())
+    """
+    names: Sequence[str]
+    columns: Dict[str, np.ndarray]
+    _rows: Dict[str, int]
+
+    def __init__(self, names: Sequence[str], columns: Dict[str, np.ndarray]) -> None:
+        """
+        Initialize a store from the pokemon names and one array per field.
+        If a name appears more than once, the last row with that name is used.
+
+        >>> store = StatsStore(["Bulbasaur"], {field: np.array([45]) for field in FIELDS})
+        >>> store["Bulbasaur"]["hp"]
+        45
+        >>> dict(store["Bulbasaur"])["pokedex_id"]
+        45
+        """
+        self.names = names
+        self.columns = columns
+        self._rows = dict(zip(names, range(len(names))))
+
+    def __getitem__(self, name: str) -> StatsRecord:
+        """Return the stats of the pokemon with the given name.
+        """
+        return StatsRecord(self, self._rows[name])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._rows
+
+    def row(self, name: str) -> int:
+        """Return the row of the pokemon with the given name.
+        """
+        return self._rows[name]
+
+
+class StatsRecord(Mapping):
+    """
+    A class that represents a read-only view of the stats of one pokemon
+
+    Private Instance Attributes:
+        - _store: The store holding the stats
+        - _row: The row of the pokemon in the store
+    """
+    __slots__ = ("_store", "_row")
+    _store: StatsStore
+    _row: int
+
+    def __init__(self, store: StatsStore, row: int) -> None:
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field: str) -> int:
+        """Return the given field of this pokemon.
+        """
+        return int(self._store.columns[field][self._row])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
@@ -0,0 +1,113 @@
+"""
+Streaming Quantiles Module
+===============================
+The functions/classes defined in this class are responsible for estimating
+quantiles of data that arrives in chunks and is too large to sort in memory.
+
+The estimate is a merging t-digest: the data seen so far is summarized by at
+most a few hundred weighted centroids, which are kept small near the extremes
+and larger around the median, so every quantile is accurate to a small
+fraction of a percent. Each chunk is merged into the digest with whole-array
+NumPy operations, so the cost per value is a sort rather than a Python loop.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+from __future__ import annotations
+from typing import Optional, Sequence
+import numpy as np
+
+
+class TDigest:
+    """
+    A class that represents a merging t-digest of a stream of numbers
+
+    Instance Attributes:
+        - compression: Bounds the number of centroids (to about compression / 2),
+        larger values give more accurate quantiles
+        - means: The mean of every centroid, in ascending order
+        - weights: The number of values summarized by every centroid
+        - minimum: The smallest value seen, or None if no value was seen
+        - maximum: The largest value seen, or None if no value was seen
+
+    Representation Invariants:
+        - len(self.means) == len(self.weights)
+        - all(self.means[i] <= self.means[i + 1] for i in range(len(self.means) - 1))
+    """
+    compression: float
+    means: np.ndarray
+    weights: np.ndarray
+    minimum: Optional[float]
+    maximum: Optional[float]
+
+    def __init__(self, compression: float = 200) -> None:
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, values: Sequence[float]) -> None:
+        """
+        Add a chunk of values to the digest.
+
+        :param values:
+            The values, in any order
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+
+        chunk_min, chunk_max = float(values.min()), float(values.max())
+        self.minimum = chunk_min if self.minimum is None else min(self.minimum, chunk_min)
+        self.maximum = chunk_max if self.maximum is None else max(self.maximum, chunk_max)
+
+        means = np.concatenate((self.means, values))
+        weights = np.concatenate((self.weights, np.ones(len(values))))
+        order = np.argsort(means, kind="stable")
+        self._compress(means[order], weights[order])
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        """
+        Merge sorted centroids so that no centroid spans more than one unit of
+        the scale function k(q) = compression / (2 pi) * arcsin(2q - 1).
+        """
+        total = weights.sum()
+        left_quantiles = (np.cumsum(weights) - weights) / total
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * left_quantiles - 1)
+
+        # Centroids whose left edge falls in the same unit of the scale are merged
+        groups = np.floor(scale)
+        starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def quantile(self, qs: Sequence[float]) -> np.ndarray:
+        """
+        Estimate quantiles of every value added so far.
+
+        >>> digest = TDigest()
+        >>> for start in range(0, 100000, 10000):
+        ...     digest.update(np.arange(start, start + 10000))
+        >>> [round(float(q)) for q in digest.quantile([0, 0.25, 0.75, 1])]
+        [0, 25000, 75000, 99999]
+
+        :param qs:
+            The quantiles to estimate, each between 0 and 1
+        :return:
+            The estimated value of every quantile in qs
+        """
+        qs = np.asarray(qs, dtype=np.float64)
+        if len(self.weights) == 0:
+            return np.full(qs.shape, np.nan)
+
+        # Each centroid's mean sits at the middle of the quantile range it covers,
+        # and the minimum and maximum anchor both ends
+        total = self.weights.sum()
+        centers = (np.cumsum(self.weights) - self.weights / 2) / total
+        positions = np.concatenate(([0.0], centers, [1.0]))
+        values = np.concatenate(([self.minimum], self.means, [self.maximum]))
+
+        return np.interp(qs, positions, values)
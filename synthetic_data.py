@@ -0,0 +1,148 @@
+"""
+Synthetic Data Module
+===============================
+The functions defined in this class are responsible for generating
+pokemon.csv-shaped datasets of any size, so that the program can be
+benchmarked on far more rows than the real dataset has.
+
+Every synthetic pokemon is a copy of a random real pokemon, with each of its
+stats jittered by about 10%. This keeps the real stat distributions, the
+correlations between stats and the type frequencies, instead of drawing every
+column independently. Only the columns the program uses are written.
+===============================
+This file is Copyright (c) 2021 Aditya Mehrotra.
+"""
+
+import argparse
+from typing import Iterator, Optional
+import numpy as np
+import pandas as pd
+from process import DATA_PATH, USED_COLUMNS, read_data
+
+STATS = ["attack", "defense", "speed", "sp_defense", "sp_attack", "hp"]
+
+# The relative standard deviation of the noise added to every stat
+STAT_JITTER = 0.1
+
+
+def generate_chunks(rows: int, source: pd.DataFrame, order: str = "random", seed: int = 0,
+                    chunk_rows: int = 1000000) -> Iterator[pd.DataFrame]:
+    """
+    Generates a synthetic dataset in chunks of at most chunk_rows rows.
+
+    Preconditions:
+        - order in {"random", "sorted"}
+        - len(source) > 0
+
+    :param rows:
+        The number of rows to generate
+    :param source:
+        The real dataset that synthetic pokemon are copied from
+    :param order:
+        "random" for rows in random order, or "sorted" for rows in ascending
+        order of attack (the order that is worst for a BST built by insertion)
+    :param seed:
+        The seed of the random generator, the same seed gives the same dataset
+    :param chunk_rows:
+        The maximum number of rows in each chunk
+    :return:
+        An iterator over the chunks of the dataset, with the columns in USED_COLUMNS
+    """
+    rng = np.random.default_rng(seed)
+    parents = rng.integers(0, len(source), size=rows)
+
+    # The stats are generated up front (they are small), so that sorted order is global
+    stats = {}
+    for stat in STATS:
+        base = source.loc[:, stat].to_numpy().astype(np.float32)[parents]
+        noisy = base * rng.normal(1.0, STAT_JITTER, size=rows).astype(np.float32)
+        stats[stat] = np.clip(np.rint(noisy), 1, 255).astype(np.int16)
+
+    if order == "sorted":
+        permutation = np.argsort(stats["attack"], kind="stable")
+        parents = parents[permutation]
+        stats = {stat: column[permutation] for stat, column in stats.items()}
+
+    source_names = source.loc[:, "name"].to_numpy().astype(str)
+    type1 = source.loc[:, "type1"].astype(object).to_numpy()
+    type2 = source.loc[:, "type2"].astype(object).to_numpy()
+
+    for start in range(0, rows, chunk_rows):
+        end = min(rows, start + chunk_rows)
+        chunk_parents = parents[start:end]
+        numbers = np.arange(start + 1, end + 1)
+
+        # Names are unique, since the program looks pokemon up by name
+        chunk = pd.DataFrame({"name": np.char.add(np.char.add(source_names[chunk_parents], "-"),
+                                                  numbers.astype(str)),
+                              "pokedex_number": numbers,
+                              "type1": type1[chunk_parents],
+                              "type2": type2[chunk_parents]})
+        for stat in STATS:
+            chunk[stat] = stats[stat][start:end]
+        yield chunk.loc[:, USED_COLUMNS]
+
+
+def generate_data(rows: int, source: Optional[pd.DataFrame] = None, order: str = "random",
+                  seed: int = 0) -> pd.DataFrame:
+    """
+    Generates a synthetic dataset in memory, see generate_chunks.
+
+    >>> df = generate_data(1000, order="sorted")
+    >>> len(df), bool(df["attack"].is_monotonic_increasing), df["name"].is_unique
+    (1000, True, True)
+
+    :param rows:
+        The number of rows to generate
+    :param source:
+        The real dataset that synthetic pokemon are copied from, read_data() by default
+    :param order:
+        "random" or "sorted"
+    :param seed:
+        The seed of the random generator
+    :return:
+        A pandas dataframe with the columns in USED_COLUMNS
+    """
+    source = read_data() if source is None else source
+    return pd.concat(list(generate_chunks(rows, source, order, seed)), ignore_index=True)
+
+
+def write_csv(path: str, rows: int, source: Optional[pd.DataFrame] = None, order: str = "random",
+              seed: int = 0, chunk_rows: int = 1000000) -> None:
+    """
+    Writes a synthetic dataset to a CSV file that read_data can load, one
+    chunk at a time so that large datasets are never held in memory as text.
+
+    :param path:
+        The path of the CSV file
+    :param rows:
+        The number of rows to generate
+    :param source:
+        The real dataset that synthetic pokemon are copied from, read_data() by default
+    :param order:
+        "random" or "sorted"
+    :param seed:
+        The seed of the random generator
+    :param chunk_rows:
+        The maximum number of rows generated and written at a time
+    """
+    source = read_data() if source is None else source
+    for i, chunk in enumerate(generate_chunks(rows, source, order, seed, chunk_rows)):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic pokemon dataset")
+    parser.add_argument("path", help="the CSV file to write")
+    parser.add_argument("--rows", type=int, default=100000, help="the number of rows to generate")
+    parser.add_argument("--order", choices=["random", "sorted"], default="random",
+                        help="random rows, or rows in ascending order of attack")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the random generator")
+    parser.add_argument("--source", default=DATA_PATH, help="the real dataset to copy pokemon from")
+    args = parser.parse_args()
+
+    write_csv(args.path, args.rows, read_data(args.source), args.order, args.seed)
+
+
+if __name__ == '__main__':
+    main()